@@ -0,0 +1,61 @@
+"""
+Handle computation throughput.
+
+Computes node and link handles for a stream of lookups drawn from a small set of
+distinct atoms, as in ingestion and query building, once with AtomDB's hashing and
+once through a HandleCache, and reports the lookups per second and the cache stats.
+
+    python benchmarks/handle_benchmark.py [number of lookups]
+"""
+import random
+import sys
+import time
+
+from hyperon_das_atomdb import AtomDB
+
+from hyperon_das.cache import HANDLE_CACHE_SIZE, HandleCache
+
+DISTINCT_NODES = 2000
+DISTINCT_LINKS = 2000
+REPEAT = 3
+
+
+def _best(function):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(count: int) -> None:
+    random.seed(0)
+    names = [f'concept-{i}' for i in range(DISTINCT_NODES)]
+    handles = [AtomDB.node_handle('Concept', name) for name in names]
+    links = [(random.choice(handles), random.choice(handles)) for _ in range(DISTINCT_LINKS)]
+    nodes = [('Concept', random.choice(names)) for _ in range(count)]
+    targets = [list(random.choice(links)) for _ in range(count)]
+
+    def hashed():
+        for node_type, node_name in nodes:
+            AtomDB.node_handle(node_type, node_name)
+        for link_targets in targets:
+            AtomDB.link_handle('Similarity', link_targets)
+
+    cache = HandleCache(HANDLE_CACHE_SIZE)
+
+    def cached():
+        cache.node_handles(nodes)
+        for link_targets in targets:
+            cache.link_handle('Similarity', link_targets)
+
+    for label, function in [('AtomDB', hashed), ('HandleCache', cached)]:
+        elapsed = _best(function)
+        print(f'{label}: {2 * count / elapsed:,.0f} handles/s (best of {REPEAT})')
+    print(f'cache stats: {cache.stats()}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,52 @@
+"""
+Memory used by query answers.
+
+Builds answers the way the query evaluators do (one frozen Assignment per answer,
+with handles decoded separately for each answer as they are when read from the
+backend) and reports the memory retained per answer and the time of a full GC pass.
+
+    python benchmarks/memory_benchmark.py [number of answers]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from hyperon_das.utils import Assignment, QueryAnswer
+
+VARIABLES = ['v1', 'v2', 'v3']
+DISTINCT_HANDLES = 1000
+
+
+def build_answers(count: int):
+    subgraph = {'handle': 'l1', 'type': 'Similarity', 'targets': []}
+    answers = []
+    for i in range(count):
+        assignment = Assignment()
+        for position, label in enumerate(VARIABLES):
+            # A new string object per answer, like handles decoded from backend replies
+            handle = ''.join(['%032x' % ((i + position) % DISTINCT_HANDLES)])
+            assignment.assign(label, handle)
+        assignment.freeze()
+        answers.append(QueryAnswer(subgraph, assignment))
+    return answers
+
+
+def main(count: int) -> None:
+    gc.collect()
+    tracemalloc.start()
+    answers = build_answers(count)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    gc.collect()
+    gc_time = time.perf_counter() - start
+    print(f'answers: {len(answers)}')
+    print(f'memory per answer: {size / count:.1f} bytes')
+    print(f'total memory: {size / 2**20:.1f} MiB')
+    print(f'full gc pass: {gc_time * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,91 @@
+"""
+Pattern matcher assignment operations.
+
+Builds the assignments an unordered Similarity(v1, v2) link produces for a synthetic
+set of links and times the operations in the inner loop of And.matched: joining the
+resulting composite assignments with another unordered term and with ordered terms.
+Also times the check of ordered assignments against the negated answers of a NOT term
+done at the end of And.matched.
+
+    python benchmarks/pattern_matcher_benchmark.py
+"""
+import random
+import time
+
+from hyperon_das.pattern_matcher import NegationIndex, OrderedAssignment, UnorderedAssignment
+
+CONCEPTS = 50
+LINKS = 300
+REPEAT = 3
+ORDERED = CONCEPTS
+CANDIDATES = 5000
+NEGATIONS = 2000
+
+
+def _similarity(variables, values):
+    assignment = UnorderedAssignment()
+    for variable, value in zip(variables, values):
+        assignment.assign(variable, value)
+    assignment.freeze()
+    return assignment
+
+
+def _ordered(mapping):
+    assignment = OrderedAssignment()
+    for variable, value in mapping.items():
+        assignment.assign(variable, value)
+    assignment.freeze()
+    return assignment
+
+
+def _negations() -> None:
+    def random_ordered():
+        return _ordered(
+            {'v1': f'c{random.randrange(CONCEPTS)}', 'v2': f'c{random.randrange(CONCEPTS)}'}
+        )
+
+    candidates = [random_ordered() for _ in range(CANDIDATES)]
+    negations = {random_ordered() for _ in range(NEGATIONS)}
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        index = NegationIndex(negations)
+        allowed = sum(1 for candidate in candidates if index.allows(candidate))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'candidates: {CANDIDATES} negations: {len(negations)} allowed: {allowed}')
+    print(f'best of {REPEAT}: {best * 1000:.1f} ms')
+
+
+def main() -> None:
+    random.seed(0)
+    pairs = [
+        (f'c{random.randrange(CONCEPTS)}', f'c{random.randrange(CONCEPTS)}') for _ in range(LINKS)
+    ]
+    first = [_similarity(['v1', 'v2'], pair) for pair in pairs]
+    second = [_similarity(['v2', 'v3'], pair) for pair in pairs[: LINKS // 10]]
+    ordered = [_ordered({'v2': f'c{i}'}) for i in range(ORDERED)]
+
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        composites = []
+        for a in first:
+            for b in second:
+                joint = a.join(b)
+                if joint is not None:
+                    composites.append(joint)
+        joins = 0
+        for composite in composites:
+            for assignment in ordered:
+                if composite.join(assignment) is not None:
+                    joins += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'composites: {len(composites)} joins with ordered terms: {joins}')
+    print(f'best of {REPEAT}: {best * 1000:.1f} ms')
+    _negations()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Query evaluation time.
+
+Times out-of-place merges of k-variable assignments with a 1-variable one, which is
+what the conjunction evaluator does for every partial answer, and a three-clause
+conjunction on a synthetic knowledge base loaded in a RAM-only DAS.
+
+    python benchmarks/query_benchmark.py
+"""
+import random
+import time
+
+from hyperon_das import DistributedAtomSpace
+from hyperon_das.utils import Assignment
+
+MERGES = 100000
+CONCEPTS = 300
+SIMILARITIES = 3000
+CATEGORIES = 10
+
+
+def _assignment(mapping):
+    assignment = Assignment()
+    for label, value in mapping.items():
+        assignment.assign(label, value)
+    assignment.freeze()
+    return assignment
+
+
+def merge_benchmark() -> None:
+    other = _assignment({'w': 'handle-w'})
+    for k in [1, 8, 32, 128]:
+        assignment = _assignment({f'v{i}': f'handle-{i}' for i in range(k)})
+        start = time.perf_counter()
+        for _ in range(MERGES):
+            assignment.merge(other, in_place=False)
+        elapsed = time.perf_counter() - start
+        print(f'merge {k:>3} + 1 variables: {elapsed / MERGES * 1e6:.2f} us')
+
+
+def _concept(i: int) -> dict:
+    return {'type': 'Concept', 'name': f'c{i}'}
+
+
+def _variable(name: str) -> dict:
+    return {'atom_type': 'variable', 'name': name}
+
+
+def query_benchmark() -> None:
+    random.seed(0)
+    das = DistributedAtomSpace()
+    for _ in range(SIMILARITIES):
+        targets = [_concept(random.randrange(CONCEPTS)), _concept(random.randrange(CONCEPTS))]
+        das.add_link({'type': 'Similarity', 'targets': targets})
+    for i in range(CONCEPTS):
+        category = {'type': 'Category', 'name': f'k{i % CATEGORIES}'}
+        das.add_link({'type': 'Inheritance', 'targets': [_concept(i), category]})
+    query = [
+        {'atom_type': 'link', 'type': 'Similarity', 'targets': [_variable('v1'), _variable('v2')]},
+        {'atom_type': 'link', 'type': 'Similarity', 'targets': [_variable('v2'), _variable('v3')]},
+        {
+            'atom_type': 'link',
+            'type': 'Inheritance',
+            'targets': [_variable('v1'), {'atom_type': 'node', 'type': 'Category', 'name': 'k0'}],
+        },
+    ]
+    start = time.perf_counter()
+    answers = das.query(query, {'no_iterator': True})
+    elapsed = time.perf_counter() - start
+    print(f'conjunction: {len(answers)} answers in {elapsed * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    merge_benchmark()
+    query_benchmark()
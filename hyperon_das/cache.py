@@ -1,10 +1,12 @@
+import json
 from abc import ABC, abstractmethod
-from collections import deque
-from itertools import product
-from threading import Semaphore, Thread
-from typing import Any, Dict, List, Optional, Union
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from threading import Lock, Semaphore, Thread
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
-from hyperon_das_atomdb import WILDCARD
+from hyperon_das_atomdb import WILDCARD, AtomDB
 
 from hyperon_das.utils import Assignment, QueryAnswer
 
@@ -52,32 +54,477 @@ class ListIterator(QueryAnswerIterator):
         return not self.source
 
 
+class LimitIterator(QueryAnswerIterator):
+    def __init__(self, source: QueryAnswerIterator, limit: Optional[int], offset: int = 0):
+        super().__init__(source)
+        self.limit = limit
+        self.offset = offset
+        if not self.is_empty():
+            stop = None if limit is None else offset + limit
+            self.iterator = islice(source, offset, stop)
+
+    def is_empty(self) -> bool:
+        return self.source.is_empty() or self.limit == 0
+
+
+class OutputFormatIterator(QueryAnswerIterator):
+    def __init__(self, source: QueryAnswerIterator, format_subgraph: Callable[[Any], Any]):
+        super().__init__(source)
+        self.format_subgraph = format_subgraph
+        if not self.is_empty():
+            self.iterator = (
+                QueryAnswer(format_subgraph(query_answer.subgraph), query_answer.assignment)
+                for query_answer in source
+            )
+
+    def is_empty(self) -> bool:
+        return self.source.is_empty()
+
+
 class ProductIterator(QueryAnswerIterator):
-    def __init__(self, source: List[QueryAnswerIterator]):
+    # Nested-loop product yielding the combinations in the order of itertools.product.
+    # The first source is streamed and the others are read on demand in their first
+    # pass. Later passes re-scan the list of ListIterator sources and replay a buffer of
+    # what was read from any other source, so nothing is read before it's needed.
+    # 'restart' may give, for each source, a callable returning a new iterator over the
+    # same items. The buffer of a source which can be restarted is dropped once it holds
+    # more than 'max_buffer_size' items, and its later passes read a new iterator
+    # instead. Buffers of the other sources grow with the source.
+    def __init__(
+        self,
+        source: List[QueryAnswerIterator],
+        restart: Optional[List[Optional[Callable[[], QueryAnswerIterator]]]] = None,
+        max_buffer_size: Optional[int] = None,
+    ):
         super().__init__(source)
+        self.restart = restart or [None] * len(source)
+        self.max_buffer_size = max_buffer_size
         if not self.is_empty():
             self.current_value = tuple([iterator.get() for iterator in source])
-            self.iterator = product(*self.source)
+            self.buffers = [None] * len(source)
+            self.restarted = [False] * len(source)
+            self.iterator = self._product(0, ())
+
+    def _scan(self, level: int) -> Iterable[Any]:
+        iterator = self.source[level]
+        if level > 0 and isinstance(iterator, ListIterator):
+            yield from iterator.source
+        elif self.buffers[level] is not None:
+            yield from self.buffers[level]
+        elif self.restarted[level]:
+            yield from self.restart[level]()
+        else:
+            buffer = []
+            bounded = (
+                level > 0 and self.restart[level] is not None and self.max_buffer_size is not None
+            )
+            for item in iterator:
+                if buffer is not None and level > 0:
+                    buffer.append(item)
+                    if bounded and len(buffer) > self.max_buffer_size:
+                        buffer = None
+                yield item
+            if buffer is None:
+                self.restarted[level] = True
+            else:
+                self.buffers[level] = buffer
+
+    def _product(self, level: int, prefix: Tuple[Any, ...]) -> Iterable[Tuple[Any, ...]]:
+        last = level == len(self.source) - 1
+        for item in self._scan(level):
+            if last:
+                yield prefix + (item,)
+            else:
+                yield from self._product(level + 1, prefix + (item,))
 
     def is_empty(self) -> bool:
         return any(iterator.is_empty() for iterator in self.source)
 
 
-class AndEvaluator(ProductIterator):
-    def __init__(self, source: List[QueryAnswerIterator]):
+def copy_subgraph(subgraph: Any) -> Any:
+    # New dicts and lists for a subgraph (or list of subgraphs) and its nested targets
+    if isinstance(subgraph, list):
+        return [copy_subgraph(item) for item in subgraph]
+    if isinstance(subgraph, dict):
+        subgraph = dict(subgraph)
+        if subgraph.get("targets", None) is not None:
+            subgraph["targets"] = [copy_subgraph(target) for target in subgraph["targets"]]
+    return subgraph
+
+
+class AtomDocumentCache:
+    # Documents fetched while answering a single query, shared by all its evaluators.
+    # Every get_subgraph() call builds new dicts from them, so answers can be changed by
+    # their callers without affecting each other. Evaluators running in different threads may
+    # fetch the same document twice, but the copies are equivalent. A document is only
+    # published along with the documents of all its targets, so whatever is found in
+    # self.documents can be expanded by get_subgraph(). The handles of the nodes in the
+    # query, looked up once per query, are kept in self.node_handles.
+    def __init__(self):
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.node_handles: Dict[Tuple[str, str], Optional[str]] = {}
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fetch(
+        self,
+        handles: Iterable[str],
+        fetch_documents: Callable[[Set[str], int], Dict[str, Dict[str, Any]]],
+        arity: int = -1,
+    ) -> None:
+        # 'arity' is the number of targets of the atoms in 'handles' (-1 if unknown). It's
+        # passed on to fetch_documents() along with them, and -1 along with their targets.
+        pending = set(handles)
+        closure: Dict[str, Dict[str, Any]] = {}
+        while pending:
+            with self.lock:
+                missing = {
+                    handle
+                    for handle in pending
+                    if handle not in self.documents and handle not in closure
+                }
+                self.hits += len(pending) - len(missing)
+                self.misses += len(missing)
+            if not missing:
+                break
+            fetched = fetch_documents(missing, arity)
+            arity = -1
+            closure.update(fetched)
+            pending = {
+                target_handle
+                for atom in fetched.values()
+                for target_handle in atom.get("targets") or []
+            }
+        if closure:
+            with self.lock:
+                self.documents.update(closure)
+
+    def get_subgraph(self, handle: str) -> Dict[str, Any]:
+        subgraph = dict(self.documents[handle])
+        if subgraph.get("targets", None) is not None:
+            subgraph["targets"] = [
+                self.get_subgraph(target_handle) for target_handle in subgraph["targets"]
+            ]
+        return subgraph
+
+    def stats(self) -> Dict[str, int]:
+        return {'documents': len(self.documents), 'hits': self.hits, 'misses': self.misses}
+
+
+class QueryResultCache:
+    # Bounded LRU of materialized answers of the DistributedAtomSpace read methods.
+    # Each entry records the atom types its answer depends on, as ("node" | "link", type)
+    # pairs, so writes only evict the entries they may have changed. Entries depending
+    # on None (e.g. wildcard link types) are evicted by any write. Answers are copied in
+    # and out of the cache, so callers changing them don't change its entries.
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(method: str, *args: Any) -> str:
+        return json.dumps([method, *args], sort_keys=True, default=str)
+
+    @staticmethod
+    def query_dependencies(
+        query: Union[List[Dict[str, Any]], Dict[str, Any]]
+    ) -> Optional[Set[Tuple[str, str]]]:
+        dependencies = set()
+        pending = [query]
+        while pending:
+            query = pending.pop()
+            if isinstance(query, list):
+                pending.extend(query)
+            elif query.get("atom_type") == "link":
+                if query["type"] == WILDCARD:
+                    return None
+                dependencies.add(("link", query["type"]))
+                pending.extend(query["targets"])
+            elif query.get("atom_type") in ["node", "parameter"]:
+                dependencies.add(("node", query["type"]))
+        return dependencies
+
+    @staticmethod
+    def atom_dependencies(atom: Dict[str, Any]) -> Set[Tuple[str, str]]:
+        if "targets" not in atom:
+            return {("node", atom["type"])}
+        return set().union(
+            {("link", atom["type"])},
+            *[QueryResultCache.atom_dependencies(target) for target in atom["targets"]],
+        )
+
+    @staticmethod
+    def _copy(value: Any) -> Any:
+        # Frozen assignments and strings can't be changed, so they aren't copied
+        if isinstance(value, dict):
+            return {key: QueryResultCache._copy(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [QueryResultCache._copy(item) for item in value]
+        if isinstance(value, tuple):
+            return tuple(QueryResultCache._copy(item) for item in value)
+        return value
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return self._copy(entry[1])
+
+    def put(self, key: str, value: Any, dependencies: Optional[Set[Tuple[str, str]]]) -> None:
+        value = self._copy(value)
+        with self.lock:
+            self.entries[key] = (dependencies, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, changes: Set[Tuple[str, str]]) -> None:
+        with self.lock:
+            stale = [
+                key
+                for key, (dependencies, _) in self.entries.items()
+                if dependencies is None or dependencies & changes
+            ]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+class HandleCache:
+    # Bounded LRU of the handles computed from node (type, name) and link (type, targets)
+    # pairs by the node_handle() and link_handle() of hasher (usually an AtomDB). Handles
+    # are hashes of those pairs, so entries never go stale.
+    def __init__(self, max_entries: int, hasher: Any = AtomDB):
+        self.max_entries = max_entries
+        self.hasher = hasher
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _store(self, handles: Dict[Tuple, str]) -> None:
+        with self.lock:
+            self.entries.update(handles)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def _get(self, key: Tuple, compute: Callable[..., str], *args: Any) -> str:
+        with self.lock:
+            handle = self.entries.get(key)
+            if handle is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return handle
+            self.misses += 1
+        handle = compute(*args)
+        self._store({key: handle})
+        return handle
+
+    def node_handle(self, node_type: str, node_name: str) -> str:
+        return self._get((node_type, node_name), self.hasher.node_handle, node_type, node_name)
+
+    def link_handle(self, link_type: str, targets: List[str]) -> str:
+        return self._get((link_type, tuple(targets)), self.hasher.link_handle, link_type, targets)
+
+    def node_handles(self, nodes: Iterable[Tuple[str, str]]) -> List[str]:
+        # The lock is taken once for all the lookups and once for all the new entries
+        keys = [tuple(node) for node in nodes]
+        with self.lock:
+            handles = [self.entries.get(key) for key in keys]
+            for key, handle in zip(keys, handles):
+                if handle is not None:
+                    self.entries.move_to_end(key)
+            if None not in handles:
+                self.hits += len(keys)
+                return handles
+        computed = {}
+        for i, key in enumerate(keys):
+            if handles[i] is None:
+                if key not in computed:
+                    computed[key] = self.hasher.node_handle(*key)
+                handles[i] = computed[key]
+        with self.lock:
+            self.hits += len(keys) - len(computed)
+            self.misses += len(computed)
+        self._store(computed)
+        return handles
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+HANDLE_CACHE_SIZE = 100000
+
+handle_cache = HandleCache(HANDLE_CACHE_SIZE, AtomDB)
+
+
+class AndEvaluator(QueryAnswerIterator):
+    # Hash join: the first source is streamed and the others are indexed by the values
+    # assigned to the variables they share with the partial answer being extended.
+    # Answers come out in the same order a cartesian product of the sources would give.
+    # An answer of a source may be part of many joined answers, so each of them gets its
+    # own copy of the subgraphs.
+    # A source may also be a callable which is evaluated once per partial answer with
+    # the partial assignment, so the variables it binds restrict that clause's lookups.
+    # 'order' maps each source to the position of its subgraph in the answers.
+    # With 'max_workers' > 1 the tables and the first answer of the streamed source are
+    # evaluated concurrently, so their backend lookups overlap.
+    def __init__(
+        self,
+        source: List[Union[QueryAnswerIterator, Callable[[Assignment], Iterable[QueryAnswer]]]],
+        order: Optional[List[int]] = None,
+        document_cache: Optional[AtomDocumentCache] = None,
+        max_workers: int = 1,
+    ):
         super().__init__(source)
+        self.order = order
+        self.document_cache = document_cache
+        self.max_workers = max_workers
+        self.tables = None
+        if not self.is_empty():
+            self.iterator = self._join()
 
-    def __next__(self):
-        while True:
-            candidate = super().__next__()
-            assignments = [query_answer.assignment for query_answer in candidate]
-            composite_assignment = Assignment.compose(assignments)
+    def is_empty(self) -> bool:
+        return not self.source or any(
+            iterator.is_empty()
+            for iterator in self.source
+            if isinstance(iterator, QueryAnswerIterator)
+        )
+
+    def _build_tables(self, probe: QueryAnswerIterator, build: List[Any]) -> List[QueryAnswer]:
+        tasks = sum(1 for iterator in build if isinstance(iterator, QueryAnswerIterator))
+        if self.max_workers <= 1 or tasks == 0:
+            self.tables = [
+                self._build_table(iterator)
+                if isinstance(iterator, QueryAnswerIterator)
+                else iterator
+                for iterator in build
+            ]
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, tasks + 1)) as executor:
+            first_answer = executor.submit(next, probe, None)
+            tables = [
+                executor.submit(self._build_table, iterator)
+                if isinstance(iterator, QueryAnswerIterator)
+                else None
+                for iterator in build
+            ]
+            self.tables = [
+                iterator if table is None else table.result()
+                for iterator, table in zip(build, tables)
+            ]
+            first_answer = first_answer.result()
+        return [] if first_answer is None else [first_answer]
+
+    def _join(self):
+        probe, *build = self.source
+        first_answers = self._build_tables(probe, build)
+        for query_answer in chain(first_answers, probe):
+            assignment = query_answer.assignment
+            if assignment is None or not assignment.frozen():
+                assignment = Assignment(assignment)
+                assignment.freeze()
+            yield from self._extend(0, [query_answer.subgraph], assignment)
+
+    def _extend(self, level: int, subgraphs: List[Any], assignment: Assignment):
+        if level == len(self.tables):
+            if self.order:
+                ordered_subgraphs = [None] * len(subgraphs)
+                for subgraph, position in zip(subgraphs, self.order):
+                    ordered_subgraphs[position] = subgraph
+                subgraphs = ordered_subgraphs
+            yield QueryAnswer(copy_subgraph(subgraphs), assignment)
+            return
+        table = self.tables[level]
+        if callable(table):
+            candidates = table(assignment)
+        else:
+            candidates = self._candidates(table, assignment)
+        for query_answer in candidates:
+            if query_answer.assignment is None:
+                composite_assignment = assignment
+            else:
+                composite_assignment = assignment.merge(query_answer.assignment, in_place=False)
             if composite_assignment:
-                composite_subgraph = [query_answer.subgraph for query_answer in candidate]
-                return QueryAnswer(composite_subgraph, composite_assignment)
+                yield from self._extend(
+                    level + 1, subgraphs + [query_answer.subgraph], composite_assignment
+                )
+
+    @staticmethod
+    def _build_table(iterator: QueryAnswerIterator) -> Dict[str, Any]:
+        groups = {}
+        for position, query_answer in enumerate(iterator):
+            labels = query_answer.assignment.labels if query_answer.assignment else frozenset()
+            groups.setdefault(frozenset(labels), []).append((position, query_answer))
+        return {'groups': groups, 'indexes': {}}
+
+    @staticmethod
+    def _candidates(table: Dict[str, Any], assignment: Assignment) -> List[QueryAnswer]:
+        candidates = []
+        for labels, answers in table['groups'].items():
+            shared_labels = tuple(
+                sorted(label for label in labels if assignment.get(label) is not None)
+            )
+            if not shared_labels:
+                candidates.extend(answers)
+                continue
+            index = table['indexes'].get((labels, shared_labels))
+            if index is None:
+                index = {}
+                for position, query_answer in answers:
+                    mapping = query_answer.assignment.mapping
+                    key = tuple(mapping[label] for label in shared_labels)
+                    index.setdefault(key, []).append((position, query_answer))
+                table['indexes'][(labels, shared_labels)] = index
+            key = tuple(assignment.get(label) for label in shared_labels)
+            candidates.extend(index.get(key, []))
+        if len(table['groups']) > 1:
+            candidates.sort(key=lambda candidate: candidate[0])
+        return [query_answer for _, query_answer in candidates]
 
 
 class LazyQueryEvaluator(ProductIterator):
+    DEFAULT_BATCH_SIZE = 100
+    DEFAULT_MAX_BUFFER_SIZE = 100000
+
     def __init__(
         self,
         link_type: str,
@@ -85,62 +532,118 @@ class LazyQueryEvaluator(ProductIterator):
         # das: "DistributedAtomSpace" Circular import,
         das,
         query_parameters: Optional[Dict[str, Any]],
+        document_cache: Optional[AtomDocumentCache] = None,
+        handles_only: bool = False,
+        restart: Optional[List[Optional[Callable[[], QueryAnswerIterator]]]] = None,
     ):
-        super().__init__(source)
+        super().__init__(
+            source,
+            restart,
+            (query_parameters or {}).get('max_buffer_size', self.DEFAULT_MAX_BUFFER_SIZE),
+        )
         self.link_type = link_type
         self.query_parameters = query_parameters
         self.das = das
+        self.document_cache = document_cache or AtomDocumentCache()
         self.buffered_answer = None
-
-    def _replace_target_handles(self, link: Dict[str, Any]) -> Dict[str, Any]:
-        targets = []
-        for target_handle in link["targets"]:
-            atom = self.das.local_backend.get_atom_as_dict(target_handle)
-            if atom.get("targets", None) is not None:
-                atom = self._replace_target_handles(atom)
-            targets.append(atom)
-        link["targets"] = targets
-        return link
+        self.batch_size = max(
+            1, (query_parameters or {}).get('batch_size', self.DEFAULT_BATCH_SIZE)
+        )
+        self.handles_only = handles_only
+        self.skip = 0
+        self.remaining = None
+
+    def restrict(self, limit: Optional[int], offset: int = 0) -> None:
+        # Answers outside the window are dropped before their documents are fetched and
+        # no more batches are matched once 'limit' answers have been returned
+        self.skip = offset
+        self.remaining = limit
+
+    def _build_assignment(
+        self, target_info: Tuple[QueryAnswer, ...], link_targets: List[str]
+    ) -> Optional[Assignment]:
+        assignment = Assignment()
+        for query_answer_target, handle in zip(target_info, link_targets):
+            target = query_answer_target.subgraph
+            if target.get("atom_type", None) == "variable":
+                if not assignment.assign(target["name"], handle):
+                    return None
+            elif not assignment.merge(query_answer_target.assignment):
+                return None
+        assignment.freeze()
+        return assignment
+
+    def _evaluate_batch(self, batch: List[Tuple[QueryAnswer, ...]]) -> List[QueryAnswer]:
+        target_handles = []
+        for target_info in batch:
+            target_handles.append(
+                [
+                    WILDCARD
+                    if query_answer_target.subgraph.get("atom_type", None) == "variable"
+                    else query_answer_target.subgraph["handle"]
+                    for query_answer_target in target_info
+                ]
+            )
+        matched_links = self.das._get_matched_handles(self.link_type, target_handles)
+        answers = []
+        for target_info, target_handle, matches in zip(batch, target_handles, matched_links):
+            needs_assignment = WILDCARD in target_handle or any(
+                query_answer_target.assignment for query_answer_target in target_info
+            )
+            for link_handle, link_targets in matches:
+                assignment = None
+                if needs_assignment:
+                    assignment = self._build_assignment(target_info, link_targets)
+                    if assignment is None:
+                        continue
+                answers.append((link_handle, assignment))
+        if self.skip:
+            skipped = min(self.skip, len(answers))
+            answers = answers[skipped:]
+            self.skip -= skipped
+        if self.remaining is not None:
+            answers = answers[: self.remaining]
+            self.remaining -= len(answers)
+        if self.handles_only:
+            return [
+                QueryAnswer({"handle": link_handle}, assignment)
+                for link_handle, assignment in answers
+            ]
+        self.document_cache.fetch(
+            (link_handle for link_handle, _ in answers),
+            self.das._get_atoms_as_dict,
+            len(self.source),
+        )
+        return [
+            QueryAnswer(self.document_cache.get_subgraph(link_handle), assignment)
+            for link_handle, assignment in answers
+        ]
 
     def __next__(self):
         if self.buffered_answer:
             try:
-                return self.buffered_answer.__next__()
+                self.current_value = self.buffered_answer.__next__()
+                return self.current_value
             except StopIteration:
                 self.buffered_answer = None
-        target_info = super().__next__()
-        target_handle = []
-        wildcard_flag = False
-        for query_answer_target in target_info:
-            target = query_answer_target.subgraph
-            if target.get("atom_type", None) == "variable":
-                target_handle.append(WILDCARD)
-                wildcard_flag = True
-            else:
-                target_handle.append(target["handle"])
-        das_query_answer = self.das.get_links(self.link_type, None, target_handle)
-        lazy_query_answer = []
-        for answer in das_query_answer:
-            assignment = None
-            if wildcard_flag:
-                assignment = Assignment()
-                assignment_failed = False
-                for query_answer_target, handle in zip(target_info, answer["targets"]):
-                    target = query_answer_target.subgraph
-                    if target.get("atom_type", None) == "variable":
-                        if not assignment.assign(target["name"], handle):
-                            assignment_failed = True
-                    else:
-                        if not assignment.merge(query_answer_target.assignment):
-                            assignment_failed = True
-                    if assignment_failed:
-                        break
-                if assignment_failed:
-                    continue
-                assignment.freeze()
-            lazy_query_answer.append(QueryAnswer(self._replace_target_handles(answer), assignment))
-        self.buffered_answer = ListIterator(lazy_query_answer)
-        return self.buffered_answer.__next__()
+        while True:
+            if self.remaining == 0:
+                self.current_value = None
+                raise StopIteration
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(super().__next__())
+                except StopIteration:
+                    break
+            if not batch:
+                self.current_value = None
+                raise StopIteration
+            answers = self._evaluate_batch(batch)
+            if answers:
+                self.buffered_answer = ListIterator(answers)
+                self.current_value = self.buffered_answer.__next__()
+                return self.current_value
 
 
 class BaseLinksIterator(QueryAnswerIterator, ABC):
@@ -1,29 +1,367 @@
+import asyncio
 import contextlib
+import gzip
 import json
-from typing import Any, Dict, List, Optional, Tuple, Union
+import socket
+import threading
+import time
+import urllib.parse
+import zlib
+from concurrent.futures import Future
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple, Type, Union
 
 from hyperon_das_atomdb import AtomDoesNotExist, LinkDoesNotExist, NodeDoesNotExist
-from requests import exceptions, sessions
+from requests import adapters, exceptions, sessions
 
-from hyperon_das.exceptions import ConnectionError, HTTPError, RequestError, TimeoutError
+from hyperon_das.codecs import CODECS, Codec, JSONCodec
+from hyperon_das.exceptions import (
+    ConnectionError,
+    DecodeError,
+    HTTPError,
+    RequestError,
+    TimeoutError,
+)
 from hyperon_das.logger import logger
 
+DEFAULT_POOL_SIZE = 10
+DEFAULT_COMPRESSION_LEVEL = 6
+DEFAULT_COMPRESSION_THRESHOLD = 1024
+
+# Actions which change the server's state. They are only sent compressed once the
+# server has accepted a compressed request, so that they never have to be sent twice.
+MUTATING_ACTIONS = {'commit_changes'}
+
+COMPRESSORS = {
+    'gzip': lambda data, level: gzip.compress(data, compresslevel=level),
+    'deflate': lambda data, level: zlib.compress(data, level),
+}
+
+
+def _request_compression(
+    client: Union['FunctionsClient', 'AsyncFunctionsClient'], payload: Dict[str, Any], size: int
+) -> Optional[str]:
+    if client.compression is None or size <= client.compression_threshold:
+        return None
+    if payload['action'] in MUTATING_ACTIONS and not client.compression_accepted:
+        return None
+    return client.compression
+
+
+def _prepare_request(
+    client: Union['FunctionsClient', 'AsyncFunctionsClient'],
+    payload: Dict[str, Any],
+    codec: Codec,
+) -> Generator[Tuple[Union[str, bytes], Optional[str]], int, None]:
+    # Yields the body and the compression of each request to send for payload, and is
+    # sent the status code of each response, so that both clients retry the same way
+    data = codec.encode(payload)
+    compression = _request_compression(client, payload, len(data))
+    status = yield data, compression
+    if compression is None:
+        return
+    if HTTPStatus.OK <= status < HTTPStatus.MULTIPLE_CHOICES:
+        client.compression_accepted = True
+    elif status == HTTPStatus.UNSUPPORTED_MEDIA_TYPE:
+        # The server couldn't read the request, so it hasn't executed it
+        logger().debug(f'Remote DAS does not accept {compression} requests')
+        client.compression = None
+        if payload['action'] not in MUTATING_ACTIONS:
+            yield data, None
+    elif status == HTTPStatus.BAD_REQUEST and not client.compression_accepted:
+        # Servers which ignore Content-Encoding usually fail to parse the body with a 400
+        # instead. Only actions which don't change the server's state are compressed
+        # before a compressed request has succeeded, so they can be sent again.
+        status = yield data, None
+        # A 400 to the uncompressed request as well is an error in the request itself
+        if status != HTTPStatus.BAD_REQUEST:
+            logger().debug(f'Remote DAS does not accept {compression} requests')
+            client.compression = None
+
+
+def _codec_ping_payload(codec: Codec) -> Dict[str, Any]:
+    return {'action': 'ping', 'input': {'codecs': [codec.name, JSONCodec.name]}}
+
+
+def _negotiated_codec(
+    client: Union['FunctionsClient', 'AsyncFunctionsClient'], response: Any
+) -> Codec:
+    codec = client.preferred_codec
+    if codec.name != JSONCodec.name and (
+        not isinstance(response, dict) or response.get('codec') != codec.name
+    ):
+        logger().debug(f'Remote DAS does not support the {codec.name} codec')
+        codec = CODECS[JSONCodec.name]
+    client.codec = codec
+    return codec
+
+
+def _get_atom_payload(handle: str) -> Dict[str, Any]:
+    return {
+        'action': 'get_atom',
+        'input': {'handle': handle},
+    }
+
+
+def _get_node_payload(node_type: str, node_name: str) -> Dict[str, Any]:
+    return {
+        'action': 'get_node',
+        'input': {'node_type': node_type, 'node_name': node_name},
+    }
+
+
+def _get_link_payload(link_type: str, link_targets: List[str]) -> Dict[str, Any]:
+    return {
+        'action': 'get_link',
+        'input': {'link_type': link_type, 'link_targets': link_targets},
+    }
+
+
+def _get_links_payload(
+    link_type: str,
+    target_types: Optional[List[str]],
+    link_targets: Optional[List[str]],
+    kwargs: Dict[str, Any],
+) -> Dict[str, Any]:
+    payload = {
+        'action': 'get_links',
+        'input': {'link_type': link_type, 'kwargs': kwargs},
+    }
+    if target_types:
+        payload['input']['target_types'] = target_types
+
+    if link_targets:
+        payload['input']['link_targets'] = link_targets
+
+    return payload
+
+
+def _query_payload(query: Dict[str, Any], parameters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'action': 'query',
+        'input': {'query': query, 'parameters': parameters},
+    }
+
+
+def _count_atoms_payload() -> Dict[str, Any]:
+    return {
+        'action': 'count_atoms',
+        'input': {},
+    }
+
+
+def _commit_changes_payload() -> Dict[str, Any]:
+    return {
+        'action': 'commit_changes',
+        'input': {},
+    }
+
+
+def _get_incoming_links_payload(atom_handle: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'action': 'get_incoming_links',
+        'input': {'atom_handle': atom_handle, 'kwargs': kwargs},
+    }
+
+
+def _existing_atom(response: Any, exception: Type[Exception]) -> Any:
+    if 'not exist' in response:
+        raise exception('error')
+    return response
+
+
+def _incoming_links(response: Any, kwargs: Dict[str, Any]) -> Any:
+    if response and 'error' in response:
+        logger().debug(
+            f'Error during `get_incoming_links` request on remote Das: {response["error"]}'
+        )
+        return None, [] if kwargs.get('cursor') is not None else []
+    return response
+
+
+def _resolve_codec(codec: Optional[Union[str, Codec]]) -> Codec:
+    if isinstance(codec, str):
+        if codec not in CODECS:
+            raise ValueError(f'Invalid codec: {codec}')
+        return CODECS[codec]
+    return codec or CODECS[JSONCodec.name]
+
+
+class RequestCoalescer:
+    # Groups the items of calls made from concurrent threads within window seconds into
+    # one call of send_batch. The first caller of a group waits for the window to close,
+    # sends the batch and hands every caller its own result.
+    def __init__(self, send_batch: Callable[[List[Any]], List[Any]], window: float):
+        self.send_batch = send_batch
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending: List[Tuple[Any, Future]] = []
+
+    def call(self, item: Any) -> Any:
+        future = Future()
+        with self.lock:
+            self.pending.append((item, future))
+            leader = len(self.pending) == 1
+        if leader:
+            time.sleep(self.window)
+            with self.lock:
+                batch, self.pending = self.pending, []
+            try:
+                results = self.send_batch([item for item, _ in batch])
+                for (_, batch_future), result in zip(batch, results):
+                    batch_future.set_result(result)
+            except Exception as exception:
+                for _, batch_future in batch:
+                    batch_future.set_exception(exception)
+        return future.result()
+
 
 class FunctionsClient:
-    def __init__(self, url: str, server_count: int = 0, name: Optional[str] = None):
+    def __init__(
+        self,
+        url: str,
+        server_count: int = 0,
+        name: Optional[str] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: Optional[Union[float, Tuple[float, float]]] = None,
+        coalesce_window: Optional[float] = None,
+        compression: Optional[str] = None,
+        compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+        compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+        codec: Optional[Union[str, Codec]] = None,
+    ):
         if not name:
             self.name = f'server-{server_count}'
         self.url = url
+        self.timeout = timeout
+        # Keep-alive connections to the server are pooled by one adapter shared by the
+        # sessions of all threads, as sessions themselves aren't thread-safe
+        self.adapter = adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.sessions = threading.local()
+        self.lock = threading.Lock()
+        self.requests = 0
+        if compression is not None and compression not in COMPRESSORS:
+            raise ValueError(f'Invalid compression: {compression}')
+        # Request bodies larger than compression_threshold bytes are compressed until the
+        # server answers one with 415 Unsupported Media Type, or with 400 Bad Request before
+        # any compressed request has succeeded. Responses are compressed by the server if
+        # it supports any of the encodings requests accepts (gzip, deflate).
+        self.compression = compression
+        self.compression_accepted = False
+        self.compression_level = compression_level
+        self.compression_threshold = compression_threshold
+        self.bytes_sent = 0
+        self.bytes_sent_uncompressed = 0
+        self.bytes_received = 0
+        self.bytes_received_uncompressed = 0
+        # Codecs other than JSON are only used if the server picks them in its answer to
+        # a ping listing the codecs of the client, which is sent before the first request.
+        # Until then, self.codec is None.
+        self.preferred_codec = _resolve_codec(codec)
+        self.codec = None if self.preferred_codec.name != JSONCodec.name else self.preferred_codec
+        # Turned off the first time the server doesn't answer a batch action
+        self.batch_actions = True
+        self.coalescers = None
+        if coalesce_window is not None:
+            self.coalescers = {
+                'get_atom': RequestCoalescer(self.get_atoms, coalesce_window),
+                'get_node': RequestCoalescer(self.get_nodes, coalesce_window),
+                'get_link': RequestCoalescer(self.get_links_many, coalesce_window),
+            }
+
+    @property
+    def session(self) -> sessions.Session:
+        session = getattr(self.sessions, 'session', None)
+        if session is None:
+            session = sessions.Session()
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            self.sessions.session = session
+        return session
+
+    def close(self) -> None:
+        self.adapter.close()
+
+    def stats(self) -> Dict[str, int]:
+        connections = 0
+        poolmanager = getattr(self.adapter, 'poolmanager', None)
+        if poolmanager is not None:
+            for key in poolmanager.pools.keys():
+                connections += getattr(poolmanager.pools.get(key), 'num_connections', 0)
+        return {
+            'requests': self.requests,
+            'connections': connections,
+            'reused': max(self.requests - connections, 0),
+            'bytes_sent': self.bytes_sent,
+            'bytes_sent_uncompressed': self.bytes_sent_uncompressed,
+            'bytes_received': self.bytes_received,
+            'bytes_received_uncompressed': self.bytes_received_uncompressed,
+        }
+
+    def negotiate_codec(self) -> Codec:
+        response = None
+        if self.preferred_codec.name != JSONCodec.name:
+            response = self._send_request(
+                _codec_ping_payload(self.preferred_codec), CODECS[JSONCodec.name]
+            )
+        return _negotiated_codec(self, response)
+
+    def _request(
+        self,
+        data: Union[str, bytes],
+        compression: Optional[str],
+        content_type: str = JSONCodec.content_type,
+    ) -> Any:
+        kwargs = {} if self.timeout is None else {'timeout': self.timeout}
+        encoded = data.encode('utf-8') if isinstance(data, str) else data
+        body = data
+        headers = {}
+        if content_type != JSONCodec.content_type:
+            headers['Content-Type'] = content_type
+        if compression is not None:
+            body = COMPRESSORS[compression](encoded, self.compression_level)
+            headers['Content-Encoding'] = compression
+            headers['Content-Type'] = content_type
+        if headers:
+            kwargs['headers'] = headers
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += len(encoded) if compression is None else len(body)
+            self.bytes_sent_uncompressed += len(encoded)
+        response = self.session.request(method='POST', url=self.url, data=body, **kwargs)
+        content = response.content
+        if isinstance(content, bytes):
+            # Content-Length is the size of the body before requests decoded it
+            length = response.headers.get('Content-Length')
+            with self.lock:
+                self.bytes_received += int(length) if length else len(content)
+                self.bytes_received_uncompressed += len(content)
+        return response
 
-    def _send_request(self, payload) -> Any:
+    def _decode(self, response: Any, codec: Codec) -> Any:
+        # The server may answer in JSON even when the request used another codec
+        content_type = response.headers.get('Content-Type', '')
+        if codec.name != JSONCodec.name and content_type.startswith(codec.content_type):
+            return codec.decode(response.content)
+        return response.json()
+
+    def _send_request(self, payload, codec: Optional[Codec] = None) -> Any:
+        if codec is None:
+            codec = self.codec or self.negotiate_codec()
         try:
-            with sessions.Session() as session:
-                response = session.request(method='POST', url=self.url, data=json.dumps(payload))
+            requests = _prepare_request(self, payload, codec)
+            data, compression = next(requests)
+            while True:
+                response = self._request(data, compression, codec.content_type)
+                try:
+                    data, compression = requests.send(response.status_code)
+                except StopIteration:
+                    break
 
             response.raise_for_status()
 
             try:
-                response_data = response.json()
+                response_data = self._decode(response, codec)
             except exceptions.JSONDecodeError as e:
                 raise Exception(f"JSON decode error: {str(e)}")
 
@@ -44,8 +382,8 @@ class FunctionsClient:
                 details=str(e),
             )
         except exceptions.HTTPError as e:
-            with contextlib.suppress(exceptions.JSONDecodeError):
-                return response.json().get('error')
+            with contextlib.suppress(exceptions.JSONDecodeError, DecodeError):
+                return self._decode(response, codec).get('error')
             raise HTTPError(
                 message=f"HTTP error occurred for URL: '{self.url}' with payload: '{payload}'",
                 details=str(e),
@@ -56,35 +394,83 @@ class FunctionsClient:
                 details=str(e),
             )
 
+    def _get_atom(self, handle: str) -> Union[str, Dict]:
+        response = self._send_request(_get_atom_payload(handle))
+        return _existing_atom(response, AtomDoesNotExist)
+
+    def _get_node(self, node_type: str, node_name: str) -> Union[str, Dict]:
+        response = self._send_request(_get_node_payload(node_type, node_name))
+        return _existing_atom(response, NodeDoesNotExist)
+
+    def _get_link(self, link_type: str, link_targets: List[str]) -> Dict[str, Any]:
+        response = self._send_request(_get_link_payload(link_type, link_targets))
+        return _existing_atom(response, LinkDoesNotExist)
+
+    def _send_batch(
+        self, action: str, payload_input: Dict[str, Any], items: List[Any], get_one: Callable
+    ) -> List[Optional[Dict[str, Any]]]:
+        if self.batch_actions:
+            try:
+                response = self._send_request({'action': action, 'input': payload_input})
+            except HTTPError as exception:
+                response = exception
+            if isinstance(response, list) and len(response) == len(items):
+                return [atom if isinstance(atom, dict) else None for atom in response]
+            logger().debug(f'Remote DAS does not support `{action}`: {response}')
+            self.batch_actions = False
+        answer = []
+        for item in items:
+            try:
+                answer.append(get_one(*item))
+            except (AtomDoesNotExist, NodeDoesNotExist, LinkDoesNotExist):
+                answer.append(None)
+        return answer
+
     def get_atom(self, handle: str, **kwargs) -> Union[str, Dict]:
-        payload = {
-            'action': 'get_atom',
-            'input': {'handle': handle},
-        }
-        response = self._send_request(payload)
-        if 'not exist' in response:
+        if self.coalescers is None or not self.batch_actions:
+            return self._get_atom(handle)
+        atom = self.coalescers['get_atom'].call(handle)
+        if atom is None:
             raise AtomDoesNotExist('error')
-        return response
+        return atom
 
     def get_node(self, node_type: str, node_name: str) -> Union[str, Dict]:
-        payload = {
-            'action': 'get_node',
-            'input': {'node_type': node_type, 'node_name': node_name},
-        }
-        response = self._send_request(payload)
-        if 'not exist' in response:
+        if self.coalescers is None or not self.batch_actions:
+            return self._get_node(node_type, node_name)
+        node = self.coalescers['get_node'].call((node_type, node_name))
+        if node is None:
             raise NodeDoesNotExist('error')
-        return response
+        return node
 
     def get_link(self, link_type: str, link_targets: List[str]) -> Dict[str, Any]:
-        payload = {
-            'action': 'get_link',
-            'input': {'link_type': link_type, 'link_targets': link_targets},
-        }
-        response = self._send_request(payload)
-        if 'not exist' in response:
+        if self.coalescers is None or not self.batch_actions:
+            return self._get_link(link_type, link_targets)
+        link = self.coalescers['get_link'].call((link_type, link_targets))
+        if link is None:
             raise LinkDoesNotExist('error')
-        return response
+        return link
+
+    def get_atoms(self, handles: List[str], **kwargs) -> List[Optional[Dict[str, Any]]]:
+        return self._send_batch(
+            'get_atoms', {'handles': handles}, [(handle,) for handle in handles], self._get_atom
+        )
+
+    def get_nodes(self, nodes: List[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        payload_input = {
+            'nodes': [
+                {'node_type': node_type, 'node_name': node_name} for node_type, node_name in nodes
+            ]
+        }
+        return self._send_batch('get_nodes', payload_input, nodes, self._get_node)
+
+    def get_links_many(self, links: List[Tuple[str, List[str]]]) -> List[Optional[Dict[str, Any]]]:
+        payload_input = {
+            'links': [
+                {'link_type': link_type, 'link_targets': link_targets}
+                for link_type, link_targets in links
+            ]
+        }
+        return self._send_batch('get_links_many', payload_input, links, self._get_link)
 
     def get_links(
         self,
@@ -93,54 +479,324 @@ class FunctionsClient:
         link_targets: List[str] = None,
         **kwargs,
     ) -> Union[List[str], List[Dict]]:
-        payload = {
-            'action': 'get_links',
-            'input': {'link_type': link_type, 'kwargs': kwargs},
-        }
-        if target_types:
-            payload['input']['target_types'] = target_types
-
-        if link_targets:
-            payload['input']['link_targets'] = link_targets
-
-        return self._send_request(payload)
+        return self._send_request(_get_links_payload(link_type, target_types, link_targets, kwargs))
 
     def query(
         self,
         query: Dict[str, Any],
         parameters: Optional[Dict[str, Any]] = None,
     ) -> List[Dict[str, Any]]:
-        payload = {
-            'action': 'query',
-            'input': {'query': query, 'parameters': parameters},
-        }
-        return self._send_request(payload)
+        return self._send_request(_query_payload(query, parameters))
 
     def count_atoms(self) -> Tuple[int, int]:
-        payload = {
-            'action': 'count_atoms',
-            'input': {},
-        }
-        return self._send_request(payload)
+        return self._send_request(_count_atoms_payload())
 
     def commit_changes(self) -> Tuple[int, int]:
-        payload = {
-            'action': 'commit_changes',
-            'input': {},
-        }
-        return self._send_request(payload)
+        return self._send_request(_commit_changes_payload())
 
     def get_incoming_links(
         self, atom_handle: str, **kwargs
     ) -> List[Union[dict, str, Tuple[dict, List[dict]]]]:
-        payload = {
-            'action': 'get_incoming_links',
-            'input': {'atom_handle': atom_handle, 'kwargs': kwargs},
+        response = self._send_request(_get_incoming_links_payload(atom_handle, kwargs))
+        return _incoming_links(response, kwargs)
+
+
+DECOMPRESSORS = {
+    'gzip': gzip.decompress,
+    'deflate': zlib.decompress,
+}
+
+
+class AsyncFunctionsClient:
+    # asyncio counterpart of FunctionsClient. Requests are written as HTTP/1.1 directly on
+    # asyncio streams, and up to pool_size keep-alive connections are shared by all the
+    # coroutines using the client, so concurrent requests need no threads.
+    def __init__(
+        self,
+        url: str,
+        server_count: int = 0,
+        name: Optional[str] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: Optional[Union[float, Tuple[float, float]]] = None,
+        compression: Optional[str] = None,
+        compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+        compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+        codec: Optional[Union[str, Codec]] = None,
+    ):
+        if not name:
+            self.name = f'server-{server_count}'
+        parsed_url = urllib.parse.urlsplit(url)
+        if parsed_url.scheme not in ('http', 'https') or not parsed_url.hostname:
+            raise ValueError(f'Invalid URL: {url}')
+        self.url = url
+        self.host = parsed_url.hostname
+        self.port = parsed_url.port or (443 if parsed_url.scheme == 'https' else 80)
+        self.netloc = parsed_url.netloc
+        self.path = (parsed_url.path or '/') + (f'?{parsed_url.query}' if parsed_url.query else '')
+        self.ssl = True if parsed_url.scheme == 'https' else None
+        self.pool_size = pool_size
+        # (connect, read) timeouts of FunctionsClient add up to a timeout for the request
+        self.timeout = sum(timeout) if isinstance(timeout, tuple) else timeout
+        # Connections and the semaphore limiting them belong to the event loop of the
+        # first request and are dropped if the client is used from another loop
+        self.loop = None
+        self.semaphore = None
+        self.idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.requests = 0
+        self.connections = 0
+        if compression is not None and compression not in COMPRESSORS:
+            raise ValueError(f'Invalid compression: {compression}')
+        self.compression = compression
+        self.compression_accepted = False
+        self.compression_level = compression_level
+        self.compression_threshold = compression_threshold
+        self.bytes_sent = 0
+        self.bytes_sent_uncompressed = 0
+        self.bytes_received = 0
+        self.bytes_received_uncompressed = 0
+        self.preferred_codec = _resolve_codec(codec)
+        self.codec = None if self.preferred_codec.name != JSONCodec.name else self.preferred_codec
+
+    async def close(self) -> None:
+        self._close_idle(asyncio.get_running_loop())
+
+    def _close_idle(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Transports can only be closed by the event loop they belong to
+        idle, self.idle = self.idle, []
+        for _, writer in idle:
+            if self.loop is loop:
+                writer.close()
+            elif not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(writer.close)
+            else:
+                # Without its loop the transport can't be closed, so the connection is
+                # shut down and the socket is released along with the transport
+                with contextlib.suppress(OSError):
+                    writer.get_extra_info('socket').shutdown(socket.SHUT_RDWR)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'requests': self.requests,
+            'connections': self.connections,
+            'reused': max(self.requests - self.connections, 0),
+            'bytes_sent': self.bytes_sent,
+            'bytes_sent_uncompressed': self.bytes_sent_uncompressed,
+            'bytes_received': self.bytes_received,
+            'bytes_received_uncompressed': self.bytes_received_uncompressed,
         }
-        response = self._send_request(payload)
-        if response and 'error' in response:
-            logger().debug(
-                f'Error during `get_incoming_links` request on remote Das: {response["error"]}'
+
+    async def _exchange(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        body: bytes,
+        headers: Dict[str, str],
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        lines = [
+            f'POST {self.path} HTTP/1.1',
+            f'Host: {self.netloc}',
+            f'Content-Length: {len(body)}',
+            'Accept-Encoding: gzip, deflate',
+        ] + [f'{key}: {value}' for key, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            # The server closed the connection
+            raise asyncio.IncompleteReadError(b'', None)
+        version, status = status_line.split()[:2]
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            response_headers[key.strip().lower()] = value.strip()
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            content = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            content = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            content = await reader.read()
+            response_headers['connection'] = 'close'
+        if version == b'HTTP/1.0' and response_headers.get('connection') != 'keep-alive':
+            response_headers['connection'] = 'close'
+        return int(status), response_headers, content
+
+    async def _request(
+        self, body: bytes, headers: Dict[str, str]
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self._close_idle(loop)
+            self.loop = loop
+            self.semaphore = asyncio.Semaphore(self.pool_size)
+        async with self.semaphore:
+            while True:
+                reused = bool(self.idle)
+                if reused:
+                    reader, writer = self.idle.pop()
+                else:
+                    reader, writer = await asyncio.open_connection(
+                        self.host, self.port, ssl=self.ssl
+                    )
+                    self.connections += 1
+                try:
+                    status, response_headers, content = await self._exchange(
+                        reader, writer, body, headers
+                    )
+                except (OSError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        # Idle connections may have been closed by the server
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                if response_headers.get('connection', '').lower() == 'close':
+                    writer.close()
+                else:
+                    self.idle.append((reader, writer))
+                break
+        self.bytes_received += len(content)
+        encoding = response_headers.get('content-encoding', '').lower()
+        if encoding in DECOMPRESSORS:
+            content = DECOMPRESSORS[encoding](content)
+        self.bytes_received_uncompressed += len(content)
+        return status, response_headers, content
+
+    async def _timed_request(
+        self, data: Union[str, bytes], compression: Optional[str], content_type: str
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        body = data
+        headers = {'Content-Type': content_type}
+        if compression is not None:
+            body = COMPRESSORS[compression](data, self.compression_level)
+            headers['Content-Encoding'] = compression
+        self.requests += 1
+        self.bytes_sent += len(body)
+        self.bytes_sent_uncompressed += len(data)
+        return await asyncio.wait_for(self._request(body, headers), self.timeout)
+
+    @staticmethod
+    def _decode(response_headers: Dict[str, str], content: bytes, codec: Codec) -> Any:
+        content_type = response_headers.get('content-type', '')
+        if codec.name != JSONCodec.name and content_type.startswith(codec.content_type):
+            return codec.decode(content)
+        return json.loads(content)
+
+    async def ping(self) -> bool:
+        try:
+            status, _, _ = await self._timed_request(
+                json.dumps({'action': 'ping', 'input': {}}).encode('utf-8'),
+                None,
+                JSONCodec.content_type,
             )
-            return None, [] if kwargs.get('cursor') is not None else []
-        return response
+        except Exception:
+            return False
+        return status == 200
+
+    async def negotiate_codec(self) -> Codec:
+        response = None
+        if self.preferred_codec.name != JSONCodec.name:
+            response = await self._send_request(
+                _codec_ping_payload(self.preferred_codec), CODECS[JSONCodec.name]
+            )
+        return _negotiated_codec(self, response)
+
+    async def _send_request(self, payload, codec: Optional[Codec] = None) -> Any:
+        if codec is None:
+            codec = self.codec or await self.negotiate_codec()
+        requests = _prepare_request(self, payload, codec)
+        data, compression = next(requests)
+        try:
+            while True:
+                status, headers, content = await self._timed_request(
+                    data, compression, codec.content_type
+                )
+                try:
+                    data, compression = requests.send(status)
+                except StopIteration:
+                    break
+        except asyncio.TimeoutError as e:
+            raise TimeoutError(
+                message=f"Request timed out for URL: '{self.url}' with payload: '{payload}'",
+                details=str(e),
+            )
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            raise ConnectionError(
+                message=f"Connection error for URL: '{self.url}' with payload: '{payload}'",
+                details=str(e),
+            )
+
+        try:
+            response_data = self._decode(headers, content, codec)
+        except (ValueError, DecodeError) as e:
+            if status >= 400:
+                raise HTTPError(
+                    message=f"HTTP error occurred for URL: '{self.url}' with payload: '{payload}'",
+                    details=f'status code {status}',
+                )
+            raise Exception(f"JSON decode error: {str(e)}")
+
+        if status == 200:
+            return response_data
+        elif status >= 400 and isinstance(response_data, dict):
+            return response_data.get('error')
+        elif isinstance(response_data, dict):
+            return response_data.get('error', f'Unknown error with status code {status}')
+        return response_data
+
+    async def get_atom(self, handle: str, **kwargs) -> Union[str, Dict]:
+        response = await self._send_request(_get_atom_payload(handle))
+        return _existing_atom(response, AtomDoesNotExist)
+
+    async def get_node(self, node_type: str, node_name: str) -> Union[str, Dict]:
+        response = await self._send_request(_get_node_payload(node_type, node_name))
+        return _existing_atom(response, NodeDoesNotExist)
+
+    async def get_link(self, link_type: str, link_targets: List[str]) -> Dict[str, Any]:
+        response = await self._send_request(_get_link_payload(link_type, link_targets))
+        return _existing_atom(response, LinkDoesNotExist)
+
+    async def get_links(
+        self,
+        link_type: str,
+        target_types: List[str] = None,
+        link_targets: List[str] = None,
+        **kwargs,
+    ) -> Union[List[str], List[Dict]]:
+        return await self._send_request(
+            _get_links_payload(link_type, target_types, link_targets, kwargs)
+        )
+
+    async def query(
+        self,
+        query: Dict[str, Any],
+        parameters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        return await self._send_request(_query_payload(query, parameters))
+
+    async def count_atoms(self) -> Tuple[int, int]:
+        return await self._send_request(_count_atoms_payload())
+
+    async def commit_changes(self) -> Tuple[int, int]:
+        return await self._send_request(_commit_changes_payload())
+
+    async def get_incoming_links(
+        self, atom_handle: str, **kwargs
+    ) -> List[Union[dict, str, Tuple[dict, List[dict]]]]:
+        response = await self._send_request(_get_incoming_links_payload(atom_handle, kwargs))
+        return _incoming_links(response, kwargs)
@@ -0,0 +1,171 @@
+import json
+import re
+import struct
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Union
+
+from hyperon_das.exceptions import DecodeError
+
+
+class Codec(ABC):
+    name: str
+    content_type: str
+
+    @abstractmethod
+    def encode(self, value: Any) -> Union[str, bytes]:
+        ...
+
+    @abstractmethod
+    def decode(self, data: bytes) -> Any:
+        ...
+
+
+class JSONCodec(Codec):
+    name = 'json'
+    content_type = 'application/json'
+
+    def encode(self, value: Any) -> str:
+        return json.dumps(value)
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+_NONE, _TRUE, _FALSE, _INT, _FLOAT, _STRING, _STRING_REF, _HANDLE, _LIST, _DICT = range(10)
+_HANDLE_PATTERN = re.compile('[0-9a-f]{32}')
+_DOUBLE = struct.Struct('>d')
+
+
+class CompactCodec(Codec):
+    # Tagged binary encoding of JSON values. Every distinct string is sent once and then
+    # referred to by its position in the message, so repeated handles and dictionary keys
+    # cost one or two bytes. Handles (32 lowercase hex digits) are sent as 16 raw bytes.
+    # Lengths, positions and integers are varints. It only saves bandwidth: encoding and
+    # decoding are pure Python and take more CPU time than the C json module.
+    name = 'compact'
+    content_type = 'application/x-das-compact'
+
+    @staticmethod
+    def _varint(buffer: bytearray, value: int) -> None:
+        while value > 0x7F:
+            buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    def encode(self, value: Any) -> bytes:
+        buffer = bytearray()
+        strings: Dict[str, int] = {}
+        varint = self._varint
+
+        def encode_string(string: str) -> None:
+            position = strings.get(string)
+            if position is not None:
+                buffer.append(_STRING_REF)
+                varint(buffer, position)
+                return
+            strings[string] = len(strings)
+            if len(string) == 32 and _HANDLE_PATTERN.fullmatch(string):
+                buffer.append(_HANDLE)
+                buffer.extend(bytes.fromhex(string))
+            else:
+                encoded = string.encode('utf-8')
+                buffer.append(_STRING)
+                varint(buffer, len(encoded))
+                buffer.extend(encoded)
+
+        def encode_value(value: Any) -> None:
+            if isinstance(value, str):
+                encode_string(value)
+            elif isinstance(value, dict):
+                buffer.append(_DICT)
+                varint(buffer, len(value))
+                for key, item in value.items():
+                    encode_string(str(key))
+                    encode_value(item)
+            elif isinstance(value, (list, tuple)):
+                buffer.append(_LIST)
+                varint(buffer, len(value))
+                for item in value:
+                    encode_value(item)
+            elif value is None:
+                buffer.append(_NONE)
+            elif value is True:
+                buffer.append(_TRUE)
+            elif value is False:
+                buffer.append(_FALSE)
+            elif isinstance(value, int):
+                buffer.append(_INT)
+                varint(buffer, value << 1 if value >= 0 else (-value << 1) - 1)
+            elif isinstance(value, float):
+                buffer.append(_FLOAT)
+                buffer.extend(_DOUBLE.pack(value))
+            else:
+                raise TypeError(f'Object of type {type(value).__name__} can not be encoded')
+
+        encode_value(value)
+        return bytes(buffer)
+
+    def decode(self, data: bytes) -> Any:
+        strings: List[str] = []
+        position = 0
+
+        def varint() -> int:
+            nonlocal position
+            value = 0
+            shift = 0
+            while True:
+                byte = data[position]
+                position += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    return value
+                shift += 7
+
+        def decode_value() -> Any:
+            nonlocal position
+            tag = data[position]
+            position += 1
+            if tag == _STRING_REF:
+                return strings[varint()]
+            if tag == _HANDLE:
+                end = position + 16
+                string = data[position:end].hex()
+                position = end
+                strings.append(string)
+                return string
+            if tag == _STRING:
+                length = varint()
+                end = position + length
+                string = data[position:end].decode('utf-8')
+                position = end
+                strings.append(string)
+                return string
+            if tag == _DICT:
+                return {decode_value(): decode_value() for _ in range(varint())}
+            if tag == _LIST:
+                return [decode_value() for _ in range(varint())]
+            if tag == _NONE:
+                return None
+            if tag == _TRUE:
+                return True
+            if tag == _FALSE:
+                return False
+            if tag == _INT:
+                value = varint()
+                return value >> 1 if not value & 1 else -((value + 1) >> 1)
+            if tag == _FLOAT:
+                (value,) = _DOUBLE.unpack_from(data, position)
+                position += 8
+                return value
+            raise DecodeError(message=f'Invalid tag {tag} at byte {position - 1}')
+
+        try:
+            value = decode_value()
+        except (IndexError, UnicodeDecodeError, struct.error) as exception:
+            raise DecodeError(message='Truncated or invalid message', details=str(exception))
+        if position != len(data):
+            raise DecodeError(message=f'Unexpected data after byte {position}')
+        return value
+
+
+CODECS: Dict[str, Codec] = {codec.name: codec for codec in [JSONCodec(), CompactCodec()]}
@@ -1,10 +1,10 @@
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
-from hyperon_das_atomdb import AtomDB, AtomDoesNotExist
+from hyperon_das_atomdb import WILDCARD, AtomDoesNotExist
 from hyperon_das_atomdb.adapters import InMemoryDB, RedisMongoDB
 from hyperon_das_atomdb.exceptions import InvalidAtomDB
 
-from hyperon_das.cache import QueryAnswerIterator
+from hyperon_das.cache import QueryAnswerIterator, QueryResultCache, handle_cache
 from hyperon_das.exceptions import (
     GetTraversalCursorException,
     InvalidDASParameters,
@@ -12,6 +12,7 @@ from hyperon_das.exceptions import (
 )
 from hyperon_das.logger import logger
 from hyperon_das.query_engines import LocalQueryEngine, RemoteQueryEngine
+from hyperon_das.query_plans import PreparedQuery
 from hyperon_das.traverse_engines import TraverseEngine
 from hyperon_das.utils import Assignment, get_package_version
 
@@ -44,6 +45,27 @@ class DistributedAtomSpace:
                 details=f'query_engine={query_engine_parameter}',
             )
 
+        result_cache_size = kwargs.get('result_cache_size', 0)
+        self.result_cache = QueryResultCache(result_cache_size) if result_cache_size else None
+
+    def _cached(
+        self, key: str, dependencies: Optional[Set[Tuple[str, str]]], fetch: Callable[[], Any]
+    ) -> Any:
+        answer = self.result_cache.get(key)
+        if answer is None:
+            answer = fetch()
+            if isinstance(answer, (list, tuple)):
+                self.result_cache.put(key, answer, dependencies)
+        return answer
+
+    def _invalidate(self, changes: Optional[Set[Tuple[str, str]]] = None) -> None:
+        if self.result_cache is None:
+            return
+        if changes is None:
+            self.result_cache.clear()
+        else:
+            self.result_cache.invalidate(changes)
+
     def get_atom(self, handle: str, **kwargs) -> Union[Dict[str, Any], None]:
         """
         Retrieve information about an Atom using its handle.
@@ -194,7 +216,17 @@ class DistributedAtomSpace:
                 ...
             ]
         """
-        return self.query_engine.get_links(link_type, target_types, link_targets, **kwargs)
+        if (
+            self.result_cache is None
+            or not kwargs.get('no_iterator', True)
+            or kwargs.get('cursor') is not None
+        ):
+            return self.query_engine.get_links(link_type, target_types, link_targets, **kwargs)
+        return self._cached(
+            QueryResultCache.key('get_links', link_type, target_types, link_targets, kwargs),
+            None if link_type == WILDCARD else {("link", link_type)},
+            lambda: self.query_engine.get_links(link_type, target_types, link_targets, **kwargs),
+        )
 
     def get_incoming_links(self, atom_handle: str, **kwargs) -> List[Union[Dict[str, Any], str]]:
         """Retrieve all links pointing to Atom
@@ -250,6 +282,31 @@ class DistributedAtomSpace:
         Notes:
             - No logical connectors (AND, OR, NOT) are allowed
             - If no match is found for the query, an empty list is returned.
+            - In conjunctions, the variables bound by the most selective clauses are
+              substituted in the remaining ones before they are searched. Pass
+              `sideways_binding=False` in the parameters to evaluate each clause on its own.
+            - With `max_workers=N` (N > 1) the clauses of a conjunction which don't depend on
+              each other are evaluated concurrently on up to N threads.
+            - Links are matched and their documents fetched in windows of `batch_size`
+              (default 100) target combinations at a time.
+            - The answers of a nested link target are kept while the combinations of targets
+              are enumerated. Past `max_buffer_size` answers (default 100000, `None` for no
+              limit) they are dropped and the target is evaluated again when needed.
+            - `limit` and `offset` restrict the answers to a window of the result. Evaluation
+              stops as soon as the window is filled, and documents are only fetched for the
+              answers in the window.
+            - `return_type` selects the format of the answers' subgraphs:
+              `QueryOutputFormat.ATOM_INFO` (default) gives the expanded atom documents,
+              `QueryOutputFormat.HANDLE` gives only the handles of the matched atoms, without
+              reading any atom document, and `QueryOutputFormat.JSON` gives the expanded
+              documents serialized as a JSON string.
+            - Atom documents are fetched once per query. Each answer gets its own copy of
+              the expanded subgraph, so it can be modified without affecting the others.
+            - When the DAS is created with `result_cache_size=N`, up to N materialized answers
+              (`no_iterator=True`) of `query()` and `get_links()` are kept and reused. They are
+              dropped by `add_node()`/`add_link()` of the atom types they depend on and by
+              `clear()`, `reindex()` and `commit_changes()`. `result_cache.stats()` reports
+              the cache usage.
 
         Examples:
 
@@ -308,11 +365,90 @@ class DistributedAtomSpace:
                 }
             ]
         """
-        return self.query_engine.query(query, parameters)
+        if self.result_cache is None or not parameters.get('no_iterator', False):
+            return self.query_engine.query(query, parameters)
+        return self._cached(
+            QueryResultCache.key('query', query, parameters),
+            QueryResultCache.query_dependencies(query),
+            lambda: self.query_engine.query(query, parameters),
+        )
+
+    def count_query(
+        self,
+        query: Union[List[Dict[str, Any]], Dict[str, Any]],
+        parameters: Optional[Dict[str, Any]] = {},
+    ) -> int:
+        """
+        Count the answers of a query without building them.
+
+        The query is matched with the same semantics of `query()` but only the handles
+        of the matched links are used, so no atom documents are fetched. When the query
+        is a single link whose targets are nodes or distinct variables, the number of
+        links matching its pattern is taken directly from the backend.
+
+        Args:
+            query (Union[List[Dict[str, Any]], Dict[str, Any]]): A pattern in the format
+                accepted by `query()`.
+            parameters (Dict[str, Any], optional): query optional parameters. `limit` and
+                `offset` are ignored.
+
+        Returns:
+            int: The number of answers `query()` would return.
+
+        Examples:
+            >>> das.count_query({
+                "atom_type": "link",
+                "type": "Similarity",
+                "targets": [
+                    {"atom_type": "variable", "name": "v1"},
+                    {"atom_type": "node", "type": "Concept", "name": "human"},
+                ]
+            })
+            3
+        """
+        return self.query_engine.count_query(query, parameters)
+
+    def prepare(self, query: Union[List[Dict[str, Any]], Dict[str, Any]]) -> PreparedQuery:
+        """
+        Compile a query template into a plan which can be executed many times with
+        different node names.
+
+        The template has the same format accepted by `query()` and may also contain
+        parameter slots in place of nodes, described as
+        `{"atom_type": "parameter", "type": <node type>, "name": <slot name>}`. The
+        constant nodes of the template are looked up once, when it is prepared, and
+        each execution just builds the iterators for the given slot values.
+
+        Args:
+            query (Union[List[Dict[str, Any]], Dict[str, Any]]): A query template, possibly
+                with parameter slots.
+
+        Returns:
+            PreparedQuery: A plan whose `execute(bindings, parameters)` method accepts a dict
+                mapping slot names to node names and the same parameters as `query()`.
+
+        Raises:
+            UnexpectedQueryFormat: If the template isn't a valid query.
+            QueryParametersException: If a slot has no value when the plan is executed.
+
+        Examples:
+            >>> plan = das.prepare({
+                "atom_type": "link",
+                "type": "Inheritance",
+                "targets": [
+                    {"atom_type": "parameter", "type": "Concept", "name": "species"},
+                    {"atom_type": "variable", "name": "v1"},
+                ]
+            })
+            >>> for result in plan.execute({"species": "human"}):
+            >>>     print(result.assignment.mapping['v1'])
+        """
+        return self.query_engine.prepare(query)
 
     def commit_changes(self):
         """This method applies changes made locally to the remote server"""
         self.query_engine.commit()
+        self._invalidate()
 
     @staticmethod
     def get_node_handle(node_type: str, node_name: str) -> str:
@@ -331,7 +467,32 @@ class DistributedAtomSpace:
             >>> print(result)
             "af12f10f9ae2002a1607ba0b47ba8407"
         """
-        return AtomDB.node_handle(node_type, node_name)
+        return handle_cache.node_handle(node_type, node_name)
+
+    def get_node_handles(self, nodes: List[Tuple[str, str]]) -> List[str]:
+        """
+        This method retrieves the handles of several nodes at once.
+
+        Args:
+            nodes (List[Tuple[str, str]]): (type, name) pairs of the nodes.
+
+        Returns:
+            List[str]: The handles, in the same order as the nodes.
+
+        Notes:
+            - Handles computed by this method are kept in a bounded LRU, also used by the
+              query engine to look up nodes and links, as the same atoms are usually looked
+              up over and over. `das.query_engine.handle_cache.stats()` reports its size,
+              hits, misses, evictions and hit rate. The static `get_node_handle()` and
+              `get_link_handle()` use a similar LRU shared by the whole process,
+              `hyperon_das.cache.handle_cache`.
+
+        Examples:
+            >>> result = das.get_node_handles([('Concept', 'human'), ('Concept', 'monkey')])
+            >>> print(result)
+            ['af12f10f9ae2002a1607ba0b47ba8407', '1cdffc6b0b89ff41d68bec237481d1e1']
+        """
+        return self.query_engine.handle_cache.node_handles(nodes)
 
     @staticmethod
     def get_link_handle(link_type: str, link_targets: List[str]) -> str:
@@ -351,7 +512,7 @@ class DistributedAtomSpace:
             "bad7472f41a0e7d601ca294eb4607c3a"
 
         """
-        return AtomDB.link_handle(link_type, link_targets)
+        return handle_cache.link_handle(link_type, link_targets)
 
     def add_node(self, node_params: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -379,7 +540,9 @@ class DistributedAtomSpace:
                 }
             >>> das.add_node(node_params)
         """
-        return self.backend.add_node(node_params)
+        node = self.backend.add_node(node_params)
+        self._invalidate(QueryResultCache.atom_dependencies(node_params))
+        return node
 
     def add_link(self, link_params: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -415,7 +578,9 @@ class DistributedAtomSpace:
                 }
             >>> das.add_link(link_params)
         """
-        return self.backend.add_link(link_params)
+        link = self.backend.add_link(link_params)
+        self._invalidate(QueryResultCache.atom_dependencies(link_params))
+        return link
 
     def reindex(self, pattern_index_templates: Optional[Dict[str, Dict[str, Any]]] = None):
         """
@@ -475,11 +640,13 @@ class DistributedAtomSpace:
                     *(handle1, handle2)
                     Similarity(handle1, *)
         """
+        self._invalidate()
         return self.query_engine.reindex(pattern_index_templates)
 
     def clear(self) -> None:
         """Clear all data"""
         self.backend.clear_database()
+        self._invalidate()
         logger().debug('The database has been cleaned.')
 
     def get_traversal_cursor(self, handle: str, **kwargs) -> TraverseEngine:
@@ -52,3 +52,7 @@ class InvalidQueryEngine(BaseException):
 
 class GetTraversalCursorException(BaseException):
     ...  # pragma no cover
+
+
+class DecodeError(BaseException):
+    ...  # pragma no cover
@@ -1 +1,2 @@
 from .pattern_matcher import *  # noqa
+from .tracing import *  # noqa
@@ -1,21 +1,18 @@
 from abc import ABC, abstractmethod
-from copy import deepcopy
 from functools import cmp_to_key
-from typing import Any, Dict, FrozenSet, List, Optional, Set, Union
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Set, Tuple, Union
 
 from hyperon_das_atomdb import WILDCARD, AtomDB
 
 from .constants import CompatibilityStatus
 
-DEBUG_AND = False
-DEBUG_OR = False
-DEBUG_NOT = False
-DEBUG_LINK = False
-DEBUG_LINK_TEMPLATE = False
-
 CONFIG = {
     # Enforce different values for different variables in ordered assignments
     'no_overload': False,
+    # Number of distinct links above which the existence of the links a bound Link
+    # expression produces for a set of assignments is checked by fetching all the links
+    # matching it at once rather than one by one
+    'bulk_existence_threshold': 64,
 }
 
 
@@ -239,13 +236,13 @@ class UnorderedAssignment(Assignment):
         return True
 
     def is_covered_by_ordered(self, ordered_assignment) -> bool:
-        copy = deepcopy(self)
-        for variable, value in ordered_assignment.mapping.items():
-            copy.symbols[variable] = copy.symbols.get(variable, 0) - 1
-            copy.values[value] = copy.values.get(value, 0) - 1
-        return all(count <= 0 for count in copy.symbols.values()) and all(
-            count <= 0 for count in copy.values.values()
-        )
+        mapping = ordered_assignment.mapping
+        if any(count > (symbol in mapping) for symbol, count in self.symbols.items()):
+            return False
+        count_values = {}
+        for value in mapping.values():
+            count_values[value] = count_values.get(value, 0) + 1
+        return all(count <= count_values.get(value, 0) for value, count in self.values.items())
 
     def contains_unordered(self, unordered_assignment) -> bool:
         for symbol, count in unordered_assignment.symbols.items():
@@ -286,9 +283,20 @@ class CompositeAssignment(Assignment):
         super().__init__()
         self.unordered_mappings: List[UnorderedAssignment] = [assignment]
         self.ordered_mapping: OrderedAssignment = None
-        self.variables = deepcopy(assignment.variables)
+        self.variables = assignment.variables
         assert self._freeze()
 
+    def _copy(self) -> 'CompositeAssignment':
+        # The component assignments are frozen, so copies share them and only the
+        # list of unordered mappings is duplicated
+        answer = CompositeAssignment.__new__(CompositeAssignment)
+        answer.variables = self.variables
+        answer.hash = self.hash
+        answer.frozen = self.frozen
+        answer.unordered_mappings = list(self.unordered_mappings)
+        answer.ordered_mapping = self.ordered_mapping
+        return answer
+
     def __repr__(self):
         ret = f'Ordered = {self.ordered_mapping} | ' f'Unordered = {self.unordered_mappings}'
         return ret
@@ -361,7 +369,7 @@ class CompositeAssignment(Assignment):
 
     def join(self, other: Assignment) -> Assignment:
         assert self.frozen and other.frozen
-        answer = deepcopy(self)
+        answer = self._copy()
         if isinstance(other, OrderedAssignment):
             return answer if answer._add_ordered_mapping(other) else None
         elif isinstance(other, UnorderedAssignment):
@@ -403,6 +411,155 @@ class CompositeAssignment(Assignment):
         )
 
 
+class AssignmentPartition:
+    """
+    Assignments of an AND term grouped by kind and variables so that a join only visits
+    the ones which may be compatible with a given assignment.
+
+    Ordered assignments sharing variables with an ordered one must agree on their values,
+    so they are looked up by those values. Joins involving unordered assignments need a
+    common value (an ordered assignment must contain, or be covered by, the unordered
+    multiset and two unordered assignments with common symbols must have common values),
+    so those candidates are looked up by value. Composite assignments are always visited.
+    Indexes are built on demand for each combination of variables that is looked up.
+    """
+
+    def __init__(self, assignments: Set[Assignment]):
+        self.ordered: Dict[FrozenSet[str], List[OrderedAssignment]] = {}
+        self.unordered: Dict[FrozenSet[str], List[UnorderedAssignment]] = {}
+        self.composite: List[CompositeAssignment] = []
+        self.indexes: Dict[Any, Dict[Any, List[Assignment]]] = {}
+        for assignment in assignments:
+            if isinstance(assignment, OrderedAssignment):
+                self.ordered.setdefault(assignment.variables, []).append(assignment)
+            elif isinstance(assignment, UnorderedAssignment):
+                self.unordered.setdefault(assignment.variables, []).append(assignment)
+            else:
+                self.composite.append(assignment)
+
+    def _by_mapping(
+        self, variables: FrozenSet[str], shared: tuple, group: List[OrderedAssignment]
+    ) -> Dict[Any, List[Assignment]]:
+        index = self.indexes.get((variables, shared))
+        if index is None:
+            index = {}
+            for assignment in group:
+                key = tuple(assignment.mapping[variable] for variable in shared)
+                index.setdefault(key, []).append(assignment)
+            self.indexes[(variables, shared)] = index
+        return index
+
+    def _by_value(
+        self, kind: type, variables: FrozenSet[str], group: List[Assignment]
+    ) -> Dict[Any, List[Assignment]]:
+        index = self.indexes.get((kind, variables))
+        if index is None:
+            index = {}
+            for assignment in group:
+                for value in assignment.values:
+                    index.setdefault(value, []).append(assignment)
+            self.indexes[(kind, variables)] = index
+        return index
+
+    def _sharing_values(
+        self, assignment: Assignment, kind: type, variables: FrozenSet[str], group: List[Assignment]
+    ) -> List[Assignment]:
+        index = self._by_value(kind, variables, group)
+        candidates = {}
+        for value in assignment.values:
+            for candidate in index.get(value, []):
+                candidates[id(candidate)] = candidate
+        return list(candidates.values())
+
+    def candidates(self, assignment: Assignment) -> List[Assignment]:
+        if isinstance(assignment, CompositeAssignment):
+            return [
+                *[a for group in self.ordered.values() for a in group],
+                *[a for group in self.unordered.values() for a in group],
+                *self.composite,
+            ]
+        ordered = isinstance(assignment, OrderedAssignment)
+        answer = []
+        for variables, group in self.ordered.items():
+            shared = tuple(sorted(variables.intersection(assignment.variables)))
+            if ordered and shared:
+                index = self._by_mapping(variables, shared, group)
+                answer.extend(index.get(tuple(assignment.mapping[v] for v in shared), []))
+            elif not ordered and variables and assignment.values:
+                answer.extend(self._sharing_values(assignment, OrderedAssignment, variables, group))
+            else:
+                answer.extend(group)
+        for variables, group in self.unordered.items():
+            if (
+                variables
+                and assignment.values
+                and (ordered or variables.intersection(assignment.variables))
+            ):
+                answer.extend(
+                    self._sharing_values(assignment, UnorderedAssignment, variables, group)
+                )
+            else:
+                answer.extend(group)
+        answer.extend(self.composite)
+        return answer
+
+
+class NegationIndex:
+    """
+    Negated assignments of an AND expression indexed so that each candidate assignment is
+    only checked against the negations which may exclude it.
+
+    An ordered negation excludes an ordered assignment only if all of its (variable, value)
+    pairs are in the assignment, and any non-composite negation excludes an assignment only
+    if all of its values are among the values of the assignment. So each negation is stored
+    under one of its pairs and one of its values and a candidate looks up its own pairs and
+    values. Composite and empty negations are checked against every candidate.
+    """
+
+    def __init__(self, assignments: Set[Assignment]):
+        self.by_pair: Dict[tuple, List[OrderedAssignment]] = {}
+        self.by_value: Dict[str, List[Assignment]] = {}
+        self.unordered_by_value: Dict[str, List[UnorderedAssignment]] = {}
+        self.always: List[Assignment] = []
+        for assignment in assignments:
+            if isinstance(assignment, CompositeAssignment) or not assignment.values:
+                self.always.append(assignment)
+                continue
+            value = min(assignment.values)
+            self.by_value.setdefault(value, []).append(assignment)
+            if isinstance(assignment, OrderedAssignment):
+                variable = min(assignment.variables)
+                pair = (variable, assignment.mapping[variable])
+                self.by_pair.setdefault(pair, []).append(assignment)
+            else:
+                self.unordered_by_value.setdefault(value, []).append(assignment)
+
+    def __len__(self) -> int:
+        return sum(len(group) for group in self.by_value.values()) + len(self.always)
+
+    @staticmethod
+    def _values(assignment: Assignment) -> Set[str]:
+        if isinstance(assignment, CompositeAssignment):
+            return set().union(*[unordered.values for unordered in assignment.unordered_mappings])
+        return set(assignment.values)
+
+    def negations(self, assignment: Assignment) -> List[Assignment]:
+        answer = list(self.always)
+        values = self._values(assignment)
+        if isinstance(assignment, OrderedAssignment):
+            for pair in assignment.mapping.items():
+                answer.extend(self.by_pair.get(pair, []))
+            index = self.unordered_by_value
+        else:
+            index = self.by_value
+        for value in values:
+            answer.extend(index.get(value, []))
+        return answer
+
+    def allows(self, assignment: Assignment) -> bool:
+        return all(assignment.check_negation(tabu) for tabu in self.negations(assignment))
+
+
 class PatternMatchingAnswer:
     """
     TODO: documentation
@@ -437,6 +594,24 @@ class LogicalExpression(ABC):
     def __repr__(self):
         return '<LogicalExpression>'
 
+    def _streams(self) -> bool:
+        # Whether matched() succeeds exactly when iter_matches() yields something
+        return False
+
+    def iter_matches(
+        self, db: AtomDB, extra_parameters: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Assignment]:
+        """
+        Yields the assignments matched() would add to its answer, one at a time. Expressions
+        which can't be streamed are matched in full and their assignments are yielded.
+        """
+        answer = PatternMatchingAnswer()
+        if not self.matched(db, answer, extra_parameters):
+            return
+        if answer.negation:
+            raise ValueError(f'Negated expressions have no assignments to stream: {self}')
+        yield from answer.assignments
+
 
 class Atom(LogicalExpression, ABC):
     """
@@ -562,28 +737,77 @@ class Link(Atom):
                 first_typed_variable = False
         return all(target.matched(db, answer, extra_parameters) for target in self.targets)
 
-    def _apply_assignment(self, assignment: OrderedAssignment, db: AtomDB) -> str:
+    def _target_handles(
+        self,
+        assignment: OrderedAssignment,
+        db: AtomDB,
+        link_handles: Optional[Dict[tuple, str]] = None,
+    ) -> Tuple[str, ...]:
         targets = []
         for t in self.targets:
             if type(t) is Node:
                 targets.append(t.get_handle(db))
             elif type(t) is Link:
-                targets.append(t._apply_assignment(assignment, db))
+                targets.append(t._apply_assignment(assignment, db, link_handles))
             elif type(t) is Variable or type(t) is TypedVariable:
                 targets.append(assignment.mapping[t.name])
-        link = Link(self.atom_type, targets, self.ordered)
-        return link.get_handle(db)
+        return tuple(targets)
+
+    def _apply_assignment(
+        self,
+        assignment: OrderedAssignment,
+        db: AtomDB,
+        link_handles: Optional[Dict[tuple, str]] = None,
+    ) -> str:
+        targets = self._target_handles(assignment, db, link_handles)
+        if any(handle is None for handle in targets):
+            return None
+        if link_handles is None:
+            return db.get_link_handle(self.atom_type, list(targets))
+        key = (self.atom_type, targets)
+        if key not in link_handles:
+            link_handles[key] = db.get_link_handle(self.atom_type, list(targets))
+        return link_handles[key]
 
     def apply_assignment(self, assignment: OrderedAssignment, db: AtomDB) -> str:
-        targets = []
-        for t in self.targets:
-            if type(t) is Node:
-                targets.append(t.get_handle(db))
-            elif type(t) is Link:
-                targets.append(t._apply_assignment(assignment, db))
-            elif type(t) is Variable or type(t) is TypedVariable:
-                targets.append(assignment.mapping[t.name])
-        return Link(self.atom_type, targets, self.ordered)
+        return Link(self.atom_type, list(self._target_handles(assignment, db)), self.ordered)
+
+    def _existing_links(self, db: AtomDB, keys: Set[Tuple[str, ...]]) -> Set[Tuple[str, ...]]:
+        # Both ways compare the targets in the order of the template, as link_exists() does.
+        # Without a bound node the fetch would scan every link of the type, so lookups
+        # are used whatever the number of keys.
+        if len(keys) <= CONFIG['bulk_existence_threshold'] or not any(
+            type(t) is Node for t in self.targets
+        ):
+            return {key for key in keys if db.link_exists(self.atom_type, list(key))}
+        # Nested links are left as wildcards and compared by handle with the fetched links
+        pattern = [t.get_handle(db) if type(t) is Node else WILDCARD for t in self.targets]
+        existing = {tuple(targets) for _, targets in db.get_matched_links(self.atom_type, pattern)}
+        return keys & existing
+
+    def _streams(self) -> bool:
+        return any(isinstance(atom, Variable) for atom in self.targets) and not any(
+            isinstance(atom, LinkTemplate) for atom in self.targets
+        )
+
+    def iter_matches(
+        self, db: AtomDB, extra_parameters: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Assignment]:
+        if not self._streams():
+            yield from super().iter_matches(db, extra_parameters)
+            return
+        if not all(
+            atom.matched(db, PatternMatchingAnswer(), extra_parameters) for atom in self.targets
+        ):
+            return
+        target_handles = [atom.get_handle(db) for atom in self.targets]
+        # Different unordered links may produce the same assignment
+        seen = set()
+        for link, targets in db.get_matched_links(self.atom_type, target_handles, extra_parameters):
+            asn = self._assign_variables(db, link, targets)
+            if asn and asn.hash not in seen:
+                seen.add(asn.hash)
+                yield asn
 
     def matched(
         self,
@@ -591,66 +815,35 @@ class Link(Atom):
         answer: PatternMatchingAnswer,
         extra_parameters: Optional[Dict[str, Any]] = None,
     ) -> bool:
-        if DEBUG_LINK:
-            print('link match', self)
         if any(isinstance(atom, LinkTemplate) for atom in self.targets):
             return self._typed_variable_matched(db, answer, extra_parameters)
-        if DEBUG_LINK:
-            print('matched()', f'entering self = {self}')
         if not all(atom.matched(db, answer, extra_parameters) for atom in self.targets):
-            if DEBUG_LINK:
-                for atom in self.targets:
-                    print(
-                        'atom',
-                        atom,
-                        'atom.matched(db, answer)',
-                        atom.matched(db, answer, extra_parameters),
-                    )
-                print('matched()', f'leaving 0 self = {self}')
             return False
         target_handles = [atom.get_handle(db) for atom in self.targets]
-        if DEBUG_LINK:
-            print(f'target_handles = {target_handles}')
         if any(handle == WILDCARD for handle in target_handles):
-            if DEBUG_LINK:
-                print(f'self.atom_type = {self.atom_type} ' f'target_handles = {target_handles}')
             matched = db.get_matched_links(self.atom_type, target_handles, extra_parameters)
-            if DEBUG_LINK:
-                print(f'matched = {matched}')
-            if DEBUG_LINK:
-                print(f'len(matched) = {len(matched)}')
             answer.assignments = set()
             for match in matched:
                 link, targets = match
-                if DEBUG_LINK:
-                    print(f'match = {match}')
-                if DEBUG_LINK:
-                    print(f'link = {link}')
-                if DEBUG_LINK:
-                    print(f'targets = {targets}')
                 asn = self._assign_variables(db, link, targets)
                 if asn:
                     answer.assignments.add(asn)
-            if DEBUG_LINK:
-                print(f'len(answer.assignments) = {len(answer.assignments)}')
-            if DEBUG_LINK:
-                print(f'answer.assignments = {answer.assignments}')
-            if DEBUG_LINK:
-                print('matched()', f'leaving 1 self = {self}')
             return bool(answer.assignments)
         else:
-            if DEBUG_LINK:
-                print('matched()', f'leaving 2 self = {self}')
             if db.link_exists(self.atom_type, target_handles):
                 return True
             else:
-                new_assignments = set()
+                # Assignments which produce the same link are checked only once
+                assignments_by_link = {}
+                link_handles = {}
                 for assignment in answer.assignments:
                     assert type(assignment) is OrderedAssignment
-                    link = self.apply_assignment(assignment, db)
-                    if db.link_exists(link.atom_type, link.targets):
-                        new_assignments.add(assignment)
-                answer.assignments = new_assignments
+                    key = self._target_handles(assignment, db, link_handles)
+                    assignments_by_link.setdefault(key, []).append(assignment)
+                existing = self._existing_links(db, set(assignments_by_link))
+                answer.assignments = {
+                    assignment for key in existing for assignment in assignments_by_link[key]
+                }
                 return bool(answer.assignments)
 
 
@@ -733,26 +926,36 @@ class LinkTemplate(LogicalExpression):
                 return None
         return answer if answer.freeze() else None
 
+    def _streams(self) -> bool:
+        return True
+
+    def iter_matches(
+        self, db: AtomDB, extra_parameters: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Assignment]:
+        matched = db.get_matched_type_template(
+            [self.link_type, *[v.type for v in self.targets]], extra_parameters
+        )
+        seen = set()
+        for link, targets in matched:
+            asn = self._assign_variables(db, link, targets)
+            if asn and asn.hash not in seen:
+                seen.add(asn.hash)
+                yield asn
+
     def matched(
         self,
         db: AtomDB,
         answer: PatternMatchingAnswer,
         extra_parameters: Optional[Dict[str, Any]] = None,
     ) -> bool:
-        if DEBUG_LINK_TEMPLATE:
-            print('link template match', self)
         matched = db.get_matched_type_template(
             [self.link_type, *[v.type for v in self.targets]], extra_parameters
         )
-        if DEBUG_LINK_TEMPLATE:
-            print('len(matched)', len(matched))
         answer.assignments = set()
         for match in matched:
             link, targets = match
             asn = self._assign_variables(db, link, targets)
             if asn:
-                if DEBUG_LINK_TEMPLATE:
-                    print('asn', asn)
                 answer.assignments.add(asn)
         return bool(answer.assignments)
 
@@ -774,8 +977,6 @@ class Not(LogicalExpression):
         answer: PatternMatchingAnswer,
         extra_parameters: Optional[Dict[str, Any]] = None,
     ) -> bool:
-        if DEBUG_NOT:
-            print('NOT', self)
         self.term.matched(db, answer)
         answer.negation = not answer.negation
         return True
@@ -792,14 +993,26 @@ class Or(LogicalExpression):
     def __repr__(self):
         return f'OR({self.terms})'
 
+    def iter_matches(
+        self, db: AtomDB, extra_parameters: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Assignment]:
+        if any(isinstance(term, Not) for term in self.terms):
+            # Negative terms are subtracted from the union of the positive ones
+            yield from super().iter_matches(db, extra_parameters)
+            return
+        seen = set()
+        for term in self.terms:
+            for assignment in term.iter_matches(db, extra_parameters):
+                if assignment.hash not in seen:
+                    seen.add(assignment.hash)
+                    yield assignment
+
     def matched(
         self,
         db: AtomDB,
         answer: PatternMatchingAnswer,
         extra_parameters: Optional[Dict[str, Any]] = None,
     ) -> bool:
-        if DEBUG_OR:
-            print('OR', self)
         if not self.terms:
             return False
         assert not answer.assignments
@@ -809,50 +1022,26 @@ class Or(LogicalExpression):
         for term in self.terms:
             term_answer = PatternMatchingAnswer()
             if isinstance(term, Not):
-                if DEBUG_OR:
-                    print(f'negative term: {term}')
                 negative_terms.add(term)
                 continue
             if not term.matched(db, term_answer):
-                if DEBUG_OR:
-                    print(f'NOT MATCHED: {term}')
                 continue
             or_matched = True
             if not term_answer.assignments:
-                if DEBUG_OR:
-                    print(f'term_answer empty: {term}')
                 continue
             if not or_answer.assignments:
-                if DEBUG_OR:
-                    print(f'First term: {term}')
-                # if DEBUG_OR: print(f'term_answer:\n{term_answer}')
                 or_answer.assignments = term_answer.assignments
                 continue
-            if DEBUG_OR:
-                print(f'New term: {term}')
-            if DEBUG_OR:
-                print(f'term_answer:\n{term_answer}')
             or_answer.assignments.update(term_answer.assignments)
-            if DEBUG_OR:
-                print(f'or_answer after extending:\n{or_answer}')
         if negative_terms:
             joint_negative_term = And([t.term for t in negative_terms])
-            if DEBUG_NOT:
-                print(f'Joint negative term: {joint_negative_term}')
             term_answer = PatternMatchingAnswer()
             joint_negative_term.matched(db, term_answer)
-            if DEBUG_NOT:
-                print(f'term_answer.assignments = {term_answer.assignments}')
-            if DEBUG_NOT:
-                print(f'or_answer.assignments = {or_answer.assignments}')
-            answer.assignments = term_answer.assignments - or_answer.assignments
-            if DEBUG_NOT:
-                print(f'answer.assignments = {answer.assignments}')
+            term_answer.assignments.difference_update(or_answer.assignments)
+            answer.assignments = term_answer.assignments
             answer.negation = True
         else:
             answer.assignments = or_answer.assignments
-        if DEBUG_OR:
-            print(f'OR result = {answer}')
         return or_matched
 
 
@@ -872,14 +1061,54 @@ class And(LogicalExpression):
             return assignment
         return assignment
 
+    def _streams(self) -> bool:
+        return True
+
+    def iter_matches(
+        self, db: AtomDB, extra_parameters: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Assignment]:
+        # The first streamable term drives the evaluation. The other terms are matched
+        # in full and each assignment of the driver is joined with them depth first, so
+        # the intermediate joins are never materialized.
+        driver = next((i for i, term in enumerate(self.terms) if term._streams()), None)
+        if driver is None:
+            yield from super().iter_matches(db, extra_parameters)
+            return
+        partitions = []
+        forbidden_assignments = set()
+        for i, term in enumerate(self.terms):
+            if i == driver:
+                continue
+            term_answer = PatternMatchingAnswer()
+            if not term.matched(db, term_answer, extra_parameters):
+                return
+            if not term_answer.assignments:
+                continue
+            if term_answer.negation:
+                forbidden_assignments.update(term_answer.assignments)
+            else:
+                partitions.append(AssignmentPartition(term_answer.assignments))
+        negations = NegationIndex(forbidden_assignments)
+        seen = set()
+        for driver_assignment in self.terms[driver].iter_matches(db, extra_parameters):
+            pending = [(driver_assignment, 0)]
+            while pending:
+                assignment, depth = pending.pop()
+                if depth < len(partitions):
+                    for term_assignment in partitions[depth].candidates(assignment):
+                        joint_assignment = assignment.join(term_assignment)
+                        if joint_assignment is not None:
+                            pending.append((joint_assignment, depth + 1))
+                elif assignment.hash not in seen and negations.allows(assignment):
+                    seen.add(assignment.hash)
+                    yield self.post_process(assignment)
+
     def matched(
         self,
         db: AtomDB,
         answer: PatternMatchingAnswer,
         extra_parameters: Optional[Dict[str, Any]] = None,
     ) -> bool:
-        if DEBUG_AND:
-            print('AND', self)
         if not self.terms:
             return False
         assert not answer.assignments
@@ -888,49 +1117,25 @@ class And(LogicalExpression):
         for term in self.terms:
             term_answer = PatternMatchingAnswer()
             if not term.matched(db, term_answer, extra_parameters):
-                if DEBUG_AND:
-                    print(f'NOT MATCHED: {term}')
                 return False
             if not term_answer.assignments:
-                if DEBUG_AND:
-                    print(f'term_answer empty: {term}')
                 continue
             if term_answer.negation:
-                if DEBUG_AND:
-                    print(f'Negation: {term}')
-                # if DEBUG_AND: print(f'term_answer:\n{term_answer}')
                 forbidden_assignments.update(term_answer.assignments)
                 continue
             if not and_answer.assignments:
-                if DEBUG_AND:
-                    print(f'First term: {term}')
-                if DEBUG_AND:
-                    print(f'term_answer:\n{term_answer}')
                 and_answer.assignments = term_answer.assignments
                 continue
-            if DEBUG_AND:
-                print(f'New term: {term}')
-            if DEBUG_AND:
-                print(f'term_answer:\n{term_answer}')
             joint_assignments = []
+            partition = AssignmentPartition(term_answer.assignments)
             for and_assignment in and_answer.assignments:
-                for term_assignment in term_answer.assignments:
+                for term_assignment in partition.candidates(and_assignment):
                     joint_assignment = and_assignment.join(term_assignment)
                     if joint_assignment is not None:
                         joint_assignments.append(joint_assignment)
             and_answer.assignments = joint_assignments
-            if DEBUG_AND:
-                print(f'and_answer after join:\n{and_answer}')
-        if DEBUG_NOT:
-            print(f'FORBIDDEN = {forbidden_assignments}')
+        negations = NegationIndex(forbidden_assignments)
         for assignment in and_answer.assignments:
-            if DEBUG_NOT:
-                print(f'CHECK: {assignment}')
-            if all(assignment.check_negation(tabu) for tabu in forbidden_assignments):
+            if negations.allows(assignment):
                 answer.assignments.add(self.post_process(assignment))
-            else:
-                if DEBUG_AND:
-                    print(f'Excluding {assignment}')
-        if DEBUG_AND:
-            print(f'AND result = {answer}')
         return bool(answer.assignments)
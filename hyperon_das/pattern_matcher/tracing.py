@@ -0,0 +1,195 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from hyperon_das.logger import logger
+
+from .pattern_matcher import LogicalExpression, PatternMatchingAnswer
+
+__all__ = [
+    'ENTER',
+    'EXIT',
+    'TraceEvent',
+    'TraceSink',
+    'TraceProfile',
+    'disable_tracing',
+    'enable_tracing',
+    'log_event',
+    'tracing',
+    'tracing_enabled',
+]
+
+ENTER = 'enter'
+EXIT = 'exit'
+
+
+@dataclass
+class TraceEvent:
+    """
+    Emitted when matched() enters or leaves an expression. Exit events carry the result
+    of the call, the number of assignments in the answer and the elapsed time in seconds,
+    which includes the time spent in the sub-expressions. When matched() raises, the exit
+    event is still emitted, with matched set to None.
+    """
+
+    kind: str
+    expression: LogicalExpression
+    depth: int
+    matched: Optional[bool] = None
+    assignments: Optional[int] = None
+    elapsed: Optional[float] = None
+
+
+TraceSink = Callable[[TraceEvent], None]
+
+
+class _Trace:
+    def __init__(self, sink: TraceSink):
+        self.sink = sink
+        self.depth = 0
+
+
+# Trace of the current thread (or asyncio task), so that matches running elsewhere
+# are neither reported to its sink nor counted in its depth
+_CURRENT: ContextVar[Optional[_Trace]] = ContextVar('pattern_matcher_trace', default=None)
+
+# Original matched() methods of the classes patched while any context is tracing, and
+# the number of such contexts
+_ORIGINALS: Dict[type, Callable] = {}
+_ACTIVE = 0
+_LOCK = Lock()
+
+
+def _expression_classes() -> List[type]:
+    pending = [LogicalExpression]
+    classes = []
+    while pending:
+        cls = pending.pop()
+        classes.append(cls)
+        pending.extend(cls.__subclasses__())
+    return [cls for cls in classes if 'matched' in cls.__dict__]
+
+
+def _traced(method: Callable) -> Callable:
+    @wraps(method)
+    def matched(
+        self,
+        db: Any,
+        answer: PatternMatchingAnswer,
+        extra_parameters: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        trace = _CURRENT.get()
+        if trace is None:
+            return method(self, db, answer, extra_parameters)
+        depth = trace.depth
+        trace.sink(TraceEvent(ENTER, self, depth))
+        trace.depth = depth + 1
+        result = None
+        start = time.perf_counter()
+        try:
+            result = method(self, db, answer, extra_parameters)
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            trace.depth = depth
+            trace.sink(TraceEvent(EXIT, self, depth, result, len(answer.assignments), elapsed))
+
+    return matched
+
+
+def _update_active(before: Optional[_Trace], after: Optional[_Trace]) -> None:
+    # The matched() methods are wrapped when the first context starts tracing and put
+    # back when the last one stops, so there is no cost at all when nothing is traced
+    global _ACTIVE
+    if (before is None) == (after is None):
+        return
+    with _LOCK:
+        if after is not None:
+            _ACTIVE += 1
+            if _ACTIVE == 1:
+                for cls in _expression_classes():
+                    method = cls.__dict__['matched']
+                    if not getattr(method, '__isabstractmethod__', False):
+                        _ORIGINALS[cls] = method
+                        cls.matched = _traced(method)
+        else:
+            _ACTIVE -= 1
+            if _ACTIVE == 0:
+                while _ORIGINALS:
+                    cls, method = _ORIGINALS.popitem()
+                    cls.matched = method
+
+
+def enable_tracing(sink: TraceSink) -> None:
+    """
+    Sends a TraceEvent to sink whenever matched() enters or leaves an expression in the
+    current thread or asyncio task, replacing any sink enabled before in it.
+    """
+    before = _CURRENT.get()
+    trace = _Trace(sink)
+    _CURRENT.set(trace)
+    _update_active(before, trace)
+
+
+def disable_tracing() -> None:
+    before = _CURRENT.get()
+    _CURRENT.set(None)
+    _update_active(before, None)
+
+
+def tracing_enabled() -> bool:
+    return _CURRENT.get() is not None
+
+
+@contextmanager
+def tracing(sink: TraceSink) -> Iterator[TraceSink]:
+    # Nested contexts send the events to the innermost sink and restore the outer one
+    before = _CURRENT.get()
+    trace = _Trace(sink)
+    token = _CURRENT.set(trace)
+    _update_active(before, trace)
+    try:
+        yield sink
+    finally:
+        current = _CURRENT.get()
+        _CURRENT.reset(token)
+        _update_active(current, _CURRENT.get())
+
+
+def log_event(event: TraceEvent) -> None:
+    indent = '  ' * event.depth
+    if event.kind == ENTER:
+        logger().debug(f'{indent}{event.expression}')
+    else:
+        logger().debug(
+            f'{indent}{event.expression} matched = {event.matched} '
+            f'assignments = {event.assignments} elapsed = {event.elapsed * 1000:.3f} ms'
+        )
+
+
+class TraceProfile:
+    """
+    Trace sink which accumulates the number of calls, assignments and elapsed time of
+    each expression.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+    def __call__(self, event: TraceEvent) -> None:
+        if event.kind != EXIT:
+            return
+        entry = self.entries.setdefault(
+            repr(event.expression), {'calls': 0, 'matched': 0, 'assignments': 0, 'elapsed': 0.0}
+        )
+        entry['calls'] += 1
+        entry['matched'] += int(bool(event.matched))
+        entry['assignments'] += event.assignments
+        entry['elapsed'] += event.elapsed
+
+    def report(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return sorted(self.entries.items(), key=lambda item: item[1]['elapsed'], reverse=True)
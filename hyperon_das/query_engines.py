@@ -1,7 +1,7 @@
 import json
 from abc import ABC, abstractmethod
 from http import HTTPStatus  # noqa: F401
-from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
 
 from hyperon_das_atomdb import WILDCARD
 from hyperon_das_atomdb.exceptions import AtomDoesNotExist, LinkDoesNotExist, NodeDoesNotExist
@@ -15,23 +15,44 @@ from requests.exceptions import (  # noqa: F401
 )
 
 from hyperon_das.cache import (
-    AndEvaluator,
+    HANDLE_CACHE_SIZE,
+    AtomDocumentCache,
+    HandleCache,
     LazyQueryEvaluator,
+    LimitIterator,
     ListIterator,
     LocalGetLinks,
     LocalIncomingLinks,
+    OutputFormatIterator,
     QueryAnswerIterator,
     RemoteGetLinks,
     RemoteIncomingLinks,
 )
-from hyperon_das.client import FunctionsClient
+from hyperon_das.client import (
+    DEFAULT_COMPRESSION_LEVEL,
+    DEFAULT_COMPRESSION_THRESHOLD,
+    DEFAULT_POOL_SIZE,
+    AsyncFunctionsClient,
+    FunctionsClient,
+)
+from hyperon_das.constants import QueryOutputFormat
 from hyperon_das.decorators import retry
+from hyperon_das.exceptions import ConnectionError as DASConnectionError
 from hyperon_das.exceptions import (
     InvalidDASParameters,
     QueryParametersException,
     UnexpectedQueryFormat,
 )
 from hyperon_das.logger import logger
+from hyperon_das.query_plans import (
+    ConjunctionPlan,
+    LinkPlan,
+    NodePlan,
+    ParameterPlan,
+    PreparedQuery,
+    QueryPlan,
+    VariablePlan,
+)
 from hyperon_das.utils import Assignment, QueryAnswer, get_package_version  # noqa: F401
 
 
@@ -48,6 +69,18 @@ class QueryEngine(ABC):
     def get_link(self, link_type: str, targets: List[str]) -> Union[Dict[str, Any], None]:
         ...
 
+    @abstractmethod
+    def get_atoms(self, handles: List[str], **kwargs) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def get_nodes(self, nodes: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def get_links_many(self, links: List[Tuple[str, List[str]]]) -> List[Dict[str, Any]]:
+        ...
+
     @abstractmethod
     def get_links(
         self, link_type: str, target_types: List[str] = None, link_targets: List[str] = None
@@ -68,6 +101,18 @@ class QueryEngine(ABC):
     ) -> Union[QueryAnswerIterator, List[Tuple[Assignment, Dict[str, str]]]]:
         ...
 
+    @abstractmethod
+    def prepare(self, query: Union[List[Dict[str, Any]], Dict[str, Any]]) -> PreparedQuery:
+        ...
+
+    @abstractmethod
+    def count_query(
+        self,
+        query: Union[List[Dict[str, Any]], Dict[str, Any]],
+        parameters: Optional[Dict[str, Any]] = {},
+    ) -> int:
+        ...
+
     @abstractmethod
     def count_atoms(self) -> Tuple[int, int]:
         ...
@@ -80,47 +125,30 @@ class QueryEngine(ABC):
 class LocalQueryEngine(QueryEngine):
     def __init__(self, backend, kwargs: Optional[dict] = None) -> None:
         self.local_backend = backend
+        self.handle_cache = HandleCache(HANDLE_CACHE_SIZE, backend)
 
     def _error(self, exception: Exception):
         logger().error(str(exception))
         raise exception
 
-    def _recursive_query(
-        self,
-        query: Union[Dict[str, Any], List[Dict[str, Any]]],
-        mappings: Set[Assignment] = None,
-        parameters: Optional[Dict[str, Any]] = None,
-    ) -> QueryAnswerIterator:
-        if isinstance(query, list):
-            sub_expression_results = [
-                self._recursive_query(expression, mappings, parameters) for expression in query
-            ]
-            return AndEvaluator(sub_expression_results)
-        elif query["atom_type"] == "node":
-            try:
-                atom_handle = self.local_backend.get_node_handle(query["type"], query["name"])
-                return ListIterator(
-                    [QueryAnswer(self.local_backend.get_atom_as_dict(atom_handle), None)]
-                )
-            except NodeDoesNotExist:
-                return ListIterator([])
-        elif query["atom_type"] == "link":
-            matched_targets = []
-            for target in query["targets"]:
-                if target["atom_type"] == "node" or target["atom_type"] == "link":
-                    matched = self._recursive_query(target, mappings, parameters)
-                    if matched:
-                        matched_targets.append(matched)
-                elif target["atom_type"] == "variable":
-                    matched_targets.append(ListIterator([QueryAnswer(target, None)]))
-                else:
-                    self._error(
-                        UnexpectedQueryFormat(
-                            message="Query processing reached an unexpected state",
-                            details=f'link: {str(query)} link target: {str(query)}',
-                        )
-                    )
-            return LazyQueryEvaluator(query["type"], matched_targets, self, parameters)
+    def _build_plan(
+        self, query: Union[Dict[str, Any], List[Dict[str, Any]]], target: bool = False
+    ) -> QueryPlan:
+        atom_type = "list" if isinstance(query, list) else query.get("atom_type")
+        if atom_type == "list" and not target:
+            return ConjunctionPlan([self._build_plan(expression) for expression in query])
+        elif atom_type == "node":
+            return NodePlan(self, query["type"], query["name"])
+        elif atom_type == "parameter":
+            return ParameterPlan(self, query["type"], query["name"])
+        elif atom_type == "link":
+            return LinkPlan(
+                self,
+                query["type"],
+                [self._build_plan(target, target=True) for target in query["targets"]],
+            )
+        elif atom_type == "variable" and target:
+            return VariablePlan(query)
         else:
             self._error(
                 UnexpectedQueryFormat(
@@ -129,6 +157,70 @@ class LocalQueryEngine(QueryEngine):
                 )
             )
 
+    @staticmethod
+    def _format_subgraph(
+        subgraph: Union[Dict[str, Any], List[Dict[str, Any]]], return_type: QueryOutputFormat
+    ) -> Union[str, List[str]]:
+        if return_type == QueryOutputFormat.JSON:
+            return json.dumps(subgraph)
+        if isinstance(subgraph, list):
+            return [atom["handle"] for atom in subgraph]
+        return subgraph["handle"]
+
+    @staticmethod
+    def _result_window(parameters: Optional[Dict[str, Any]]) -> Tuple[Optional[int], int]:
+        limit = (parameters or {}).get("limit")
+        offset = (parameters or {}).get("offset") or 0
+        for name, value in [("limit", limit), ("offset", offset)]:
+            if value is not None and (not isinstance(value, int) or value < 0):
+                raise QueryParametersException(
+                    message=f'Invalid value for parameter "{name}": "{value}"',
+                    details='It must be a non-negative integer',
+                )
+        return limit, offset
+
+    @staticmethod
+    def _return_type(parameters: Optional[Dict[str, Any]]) -> QueryOutputFormat:
+        return_type = (parameters or {}).get("return_type", QueryOutputFormat.ATOM_INFO)
+        if return_type not in list(QueryOutputFormat):
+            raise QueryParametersException(
+                message=f'Invalid value for parameter "return_type": "{return_type}"',
+                details=f'The possible values are: {[f.name for f in QueryOutputFormat]}',
+            )
+        return return_type
+
+    def _execute_plan(
+        self,
+        plan: QueryPlan,
+        bindings: Dict[str, str],
+        parameters: Optional[Dict[str, Any]],
+        query: Union[List[Dict[str, Any]], Dict[str, Any]],
+    ) -> Union[QueryAnswerIterator, List[Tuple[Assignment, Dict[str, str]]]]:
+        limit, offset = self._result_window(parameters)
+        return_type = self._return_type(parameters)
+        document_cache = AtomDocumentCache()
+        query_results = plan.instantiate(
+            bindings, None, parameters, document_cache, return_type == QueryOutputFormat.HANDLE
+        )
+        if limit is not None or offset:
+            if isinstance(query_results, LazyQueryEvaluator):
+                query_results.restrict(limit, offset)
+            else:
+                query_results = LimitIterator(query_results, limit, offset)
+        if return_type != QueryOutputFormat.ATOM_INFO:
+            query_results = OutputFormatIterator(
+                query_results, lambda subgraph: self._format_subgraph(subgraph, return_type)
+            )
+        if parameters.get("no_iterator", False):
+            answer = []
+            for result in query_results:
+                answer.append(tuple([result.assignment, result.subgraph]))
+            logger().debug(f"query: {query} result: {str(answer)}")
+            logger().debug(f"query: {query} document cache: {document_cache.stats()}")
+            return answer
+        else:
+            return query_results
+
     def _to_link_dict_list(self, db_answer: Union[List[str], List[Dict]]) -> List[Dict]:
         if not db_answer:
             return []
@@ -166,6 +258,38 @@ class LocalQueryEngine(QueryEngine):
         else:
             self._error(ValueError("Invalid parameters"))
 
+    def _get_matched_handles(
+        self, link_type: str, link_targets_list: List[List[str]], **kwargs
+    ) -> List[List[Tuple[str, List[str]]]]:
+        # atomdb has no multi-pattern lookup, so the batch is deduplicated and each
+        # distinct pattern is resolved once
+        matched = {}
+        for link_targets in link_targets_list:
+            key = tuple(link_targets)
+            if key in matched:
+                continue
+            try:
+                db_answer = self.local_backend.get_matched_links(link_type, link_targets, **kwargs)
+            except LinkDoesNotExist:
+                db_answer = []
+            links = []
+            for atom in db_answer:
+                if isinstance(atom, str):
+                    links.append((atom, list(link_targets)))
+                elif len(atom) == 2 and isinstance(atom[1], (list, tuple)):
+                    links.append((atom[0], list(atom[1])))
+                else:
+                    links.append((atom[0], list(atom[1:])))
+            matched[key] = links
+        return [matched[tuple(link_targets)] for link_targets in link_targets_list]
+
+    def _get_atoms_as_dict(
+        self, handles: Iterable[str], arity: int = -1
+    ) -> Dict[str, Dict[str, Any]]:
+        return {
+            handle: self.local_backend.get_atom_as_dict(handle, arity) for handle in set(handles)
+        }
+
     def get_atom(self, handle: str, **kwargs) -> Union[Dict[str, Any], None]:
         try:
             return self.local_backend.get_atom(handle, **kwargs)
@@ -174,7 +298,7 @@ class LocalQueryEngine(QueryEngine):
 
     def get_node(self, node_type: str, node_name: str) -> Union[Dict[str, Any], None]:
         try:
-            node_handle = self.local_backend.node_handle(node_type, node_name)
+            node_handle = self.handle_cache.node_handle(node_type, node_name)
             return self.local_backend.get_atom(node_handle)
         except AtomDoesNotExist:
             raise NodeDoesNotExist(
@@ -183,13 +307,22 @@ class LocalQueryEngine(QueryEngine):
 
     def get_link(self, link_type: str, link_targets: List[str]) -> Union[Dict[str, Any], None]:
         try:
-            link_handle = self.local_backend.link_handle(link_type, link_targets)
+            link_handle = self.handle_cache.link_handle(link_type, link_targets)
             return self.local_backend.get_atom(link_handle)
         except AtomDoesNotExist:
             raise LinkDoesNotExist(
                 message='This link does not exist', details=f'{link_type}:{link_targets}'
             )
 
+    def get_atoms(self, handles: List[str], **kwargs) -> List[Dict[str, Any]]:
+        return [self.get_atom(handle, **kwargs) for handle in handles]
+
+    def get_nodes(self, nodes: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        return [self.get_node(node_type, node_name) for node_type, node_name in nodes]
+
+    def get_links_many(self, links: List[Tuple[str, List[str]]]) -> List[Dict[str, Any]]:
+        return [self.get_link(link_type, link_targets) for link_type, link_targets in links]
+
     def get_links(
         self,
         link_type: str,
@@ -243,15 +376,46 @@ class LocalQueryEngine(QueryEngine):
                     'data': {'query': query, 'parameters': parameters},
                 }
             )
-        query_results = self._recursive_query(query, parameters)
-        if no_iterator:
-            answer = []
-            for result in query_results:
-                answer.append(tuple([result.assignment, result.subgraph]))
-            logger().debug(f"query: {query} result: {str(answer)}")
-            return answer
-        else:
-            return query_results
+        return self._execute_plan(self._build_plan(query), {}, parameters, query)
+
+    def prepare(self, query: Union[List[Dict[str, Any]], Dict[str, Any]]) -> PreparedQuery:
+        return PreparedQuery(self, query, self._build_plan(query))
+
+    def _count_template(self, plan: LinkPlan) -> Optional[int]:
+        # A single link of nodes and distinct variables matches exactly the links the
+        # backend returns for its pattern, so they don't need to be evaluated
+        variables = [target for target in plan.targets if isinstance(target, VariablePlan)]
+        nodes = [target for target in plan.targets if isinstance(target, NodePlan)]
+        if len(variables) + len(nodes) != len(plan.targets) or len(variables) != len(
+            plan.variables
+        ):
+            return None
+        link_targets = []
+        for target in plan.targets:
+            if isinstance(target, VariablePlan):
+                link_targets.append(WILDCARD)
+            else:
+                handle = target.resolve()
+                if handle is None:
+                    return 0
+                link_targets.append(handle)
+        try:
+            return len(self.local_backend.get_matched_links(plan.link_type, link_targets))
+        except LinkDoesNotExist:
+            return 0
+
+    def count_query(
+        self,
+        query: Union[List[Dict[str, Any]], Dict[str, Any]],
+        parameters: Optional[Dict[str, Any]] = {},
+    ) -> int:
+        plan = self._build_plan(query)
+        if isinstance(plan, LinkPlan):
+            count = self._count_template(plan)
+            if count is not None:
+                return count
+        query_results = plan.instantiate({}, None, parameters, AtomDocumentCache(), True)
+        return sum(1 for _ in query_results)
 
     def count_atoms(self) -> Tuple[int, int]:
         return self.local_backend.count_atoms()
@@ -266,12 +430,24 @@ class LocalQueryEngine(QueryEngine):
 class RemoteQueryEngine(QueryEngine):
     def __init__(self, backend, kwargs):
         self.local_query_engine = LocalQueryEngine(backend, kwargs)
+        self.handle_cache = self.local_query_engine.handle_cache
         host = kwargs.get('host')
         port = kwargs.get('port')
         if not host:
             raise InvalidDASParameters(message='Send `host` parameter to connect in a remote DAS')
         url = self._connect_server(host, port)
-        self.remote_das = FunctionsClient(url)
+        self.remote_das = FunctionsClient(
+            url,
+            pool_size=kwargs.get('pool_size', DEFAULT_POOL_SIZE),
+            timeout=kwargs.get('request_timeout'),
+            coalesce_window=kwargs.get('coalesce_window'),
+            compression=kwargs.get('compression'),
+            compression_level=kwargs.get('compression_level', DEFAULT_COMPRESSION_LEVEL),
+            compression_threshold=kwargs.get(
+                'compression_threshold', DEFAULT_COMPRESSION_THRESHOLD
+            ),
+            codec=kwargs.get('codec'),
+        )
 
     @retry(attempts=5, timeout_seconds=120)
     def _connect_server(self, host: str, port: Optional[str] = None):
@@ -377,6 +553,58 @@ class RemoteQueryEngine(QueryEngine):
                 )
         return link
 
+    def _get_many(
+        self,
+        items: List[Any],
+        get_local: Callable[[Any], Dict[str, Any]],
+        get_remote: Callable[[List[Any]], List[Optional[Dict[str, Any]]]],
+        exception: Type[Exception],
+        message: str,
+    ) -> List[Dict[str, Any]]:
+        # Items missing from the local backend are fetched from the server in one request
+        answer = []
+        missing = []
+        for i, item in enumerate(items):
+            try:
+                answer.append(get_local(item))
+            except exception:
+                answer.append(None)
+                missing.append(i)
+        if missing:
+            remote_atoms = get_remote([items[i] for i in missing])
+            for i, atom in zip(missing, remote_atoms):
+                if atom is None:
+                    raise exception(message=message, details=f'{items[i]}')
+                answer[i] = atom
+        return answer
+
+    def get_atoms(self, handles: List[str], **kwargs) -> List[Dict[str, Any]]:
+        return self._get_many(
+            handles,
+            lambda handle: self.local_query_engine.get_atom(handle, **kwargs),
+            lambda missing: self.remote_das.get_atoms(missing, **kwargs),
+            AtomDoesNotExist,
+            'This atom does not exist',
+        )
+
+    def get_nodes(self, nodes: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        return self._get_many(
+            nodes,
+            lambda node: self.local_query_engine.get_node(*node),
+            self.remote_das.get_nodes,
+            NodeDoesNotExist,
+            'This node does not exist',
+        )
+
+    def get_links_many(self, links: List[Tuple[str, List[str]]]) -> List[Dict[str, Any]]:
+        return self._get_many(
+            links,
+            lambda link: self.local_query_engine.get_link(*link),
+            self.remote_das.get_links_many,
+            LinkDoesNotExist,
+            'This link does not exist',
+        )
+
     def get_links(
         self,
         link_type: str,
@@ -412,6 +640,32 @@ class RemoteQueryEngine(QueryEngine):
         links.extend(remote_links)
         return RemoteIncomingLinks(ListIterator(links), **kwargs)
 
+    @staticmethod
+    def _remote_parameters(parameters: Dict[str, Any]) -> Dict[str, Any]:
+        remote_parameters = {
+            key: value
+            for key, value in parameters.items()
+            if key not in ['limit', 'offset', 'return_type']
+        }
+        remote_parameters['no_iterator'] = True
+        return remote_parameters
+
+    @staticmethod
+    def _format_answer(
+        answer: Any, limit: Optional[int], offset: int, return_type: QueryOutputFormat
+    ) -> Any:
+        if not isinstance(answer, list):
+            return answer
+        if limit is not None or offset:
+            stop = None if limit is None else offset + limit
+            answer = answer[offset:stop]
+        if return_type != QueryOutputFormat.ATOM_INFO:
+            answer = [
+                (assignment, LocalQueryEngine._format_subgraph(subgraph, return_type))
+                for assignment, subgraph in answer
+            ]
+        return answer
+
     def query(
         self,
         query: Union[List[Dict[str, Any]], Dict[str, Any]],
@@ -421,10 +675,12 @@ class RemoteQueryEngine(QueryEngine):
         if query_scope == 'remote_only' or query_scope == 'synchronous_update':
             if query_scope == 'synchronous_update':
                 self.commit()
-            previous_value = parameters.get('no_iterator', False)
-            parameters['no_iterator'] = True
-            answer = self.remote_das.query(query, parameters)
-            parameters['no_iterator'] = previous_value
+            # Servers which don't know about 'limit', 'offset' or 'return_type' return every
+            # answer in ATOM_INFO format, so they are applied here and not sent to the server
+            limit, offset = LocalQueryEngine._result_window(parameters)
+            return_type = LocalQueryEngine._return_type(parameters)
+            answer = self.remote_das.query(query, self._remote_parameters(parameters))
+            answer = self._format_answer(answer, limit, offset, return_type)
         elif query_scope == 'local_only':
             answer = self.local_query_engine.query(query, parameters)
         elif query_scope == 'local_and_remote':
@@ -436,6 +692,21 @@ class RemoteQueryEngine(QueryEngine):
             )
         return answer
 
+    def prepare(self, query: Union[List[Dict[str, Any]], Dict[str, Any]]) -> PreparedQuery:
+        # The server has no notion of prepared queries, so parameters are substituted
+        # into the template and the resulting query is sent on every execution
+        return PreparedQuery(self, query)
+
+    def count_query(
+        self,
+        query: Union[List[Dict[str, Any]], Dict[str, Any]],
+        parameters: Optional[Dict[str, Any]] = {},
+    ) -> int:
+        if parameters.get('query_scope', 'remote_only') == 'local_only':
+            return self.local_query_engine.count_query(query, parameters)
+        # The server has no counting action, so the answers are fetched and counted here
+        return len(self.query(query, {**parameters, 'limit': None, 'offset': 0}))
+
     def count_atoms(self) -> Tuple[int, int]:
         local_answer = self.local_query_engine.count_atoms()
         remote_answer = self.remote_das.count_atoms()
@@ -446,3 +717,159 @@ class RemoteQueryEngine(QueryEngine):
 
     def reindex(self, pattern_index_templates: Optional[Dict[str, Dict[str, Any]]]):
         raise NotImplementedError()
+
+
+class AsyncRemoteQueryEngine:
+    """
+    asyncio variant of RemoteQueryEngine. Its methods are coroutines sending requests
+    through an AsyncFunctionsClient, so many of them can run concurrently on one event
+    loop over the client's connection pool.
+
+    The server is looked up on the first request. Unlike RemoteQueryEngine, get_links()
+    and get_incoming_links() fetch every page of the answer and return a list.
+    """
+
+    def __init__(self, backend, kwargs):
+        self.local_query_engine = LocalQueryEngine(backend, kwargs)
+        self.host = kwargs.get('host')
+        self.port = kwargs.get('port') or '8081'
+        if not self.host:
+            raise InvalidDASParameters(message='Send `host` parameter to connect in a remote DAS')
+        self.client_kwargs = {
+            'pool_size': kwargs.get('pool_size', DEFAULT_POOL_SIZE),
+            'timeout': kwargs.get('request_timeout'),
+            'compression': kwargs.get('compression'),
+            'compression_level': kwargs.get('compression_level', DEFAULT_COMPRESSION_LEVEL),
+            'compression_threshold': kwargs.get(
+                'compression_threshold', DEFAULT_COMPRESSION_THRESHOLD
+            ),
+            'codec': kwargs.get('codec'),
+        }
+        self.remote_das = None
+
+    async def connect(self) -> AsyncFunctionsClient:
+        if self.remote_das is None:
+            for url in [
+                f'http://{self.host}:{self.port}/function/query-engine',
+                f'http://{self.host}/prod/query-engine',
+            ]:
+                logger().debug(f'connecting to remote Das {url}')
+                client = AsyncFunctionsClient(url, **self.client_kwargs)
+                if await client.ping():
+                    # Another coroutine may have connected in the meantime
+                    if self.remote_das is None:
+                        self.remote_das = client
+                    else:
+                        await client.close()
+                    break
+                await client.close()
+            else:
+                raise DASConnectionError(
+                    message=f'Failed to connect to remote Das {self.host}:{self.port}'
+                )
+        return self.remote_das
+
+    async def close(self) -> None:
+        if self.remote_das is not None:
+            await self.remote_das.close()
+
+    async def get_atom(self, handle: str, **kwargs) -> Dict[str, Any]:
+        try:
+            atom = self.local_query_engine.get_atom(handle, **kwargs)
+        except AtomDoesNotExist:
+            remote_das = await self.connect()
+            try:
+                atom = await remote_das.get_atom(handle, **kwargs)
+            except AtomDoesNotExist:
+                raise AtomDoesNotExist(
+                    message='This atom does not exist', details=f'handle:{handle}'
+                )
+        return atom
+
+    @staticmethod
+    def _link_handle(link: Any) -> str:
+        return link[0]['handle'] if isinstance(link, (tuple, list)) else link['handle']
+
+    async def _fetch_pages(
+        self,
+        links: List[Any],
+        fetch: Callable[..., Any],
+        kwargs: Dict[str, Any],
+    ) -> List[Any]:
+        # Same answer as iterating over RemoteGetLinks/RemoteIncomingLinks: local links,
+        # then the pages of the server until its cursor is 0, without repeated handles
+        answer = []
+        handles = set()
+        while True:
+            cursor, remote_links = await fetch(**kwargs)
+            for link in links + remote_links:
+                handle = self._link_handle(link)
+                if handle not in handles:
+                    handles.add(handle)
+                    answer.append(link)
+            links = []
+            if not cursor:
+                return answer
+            kwargs['cursor'] = cursor
+
+    async def get_links(
+        self,
+        link_type: str,
+        target_types: List[str] = None,
+        link_targets: List[str] = None,
+        **kwargs,
+    ) -> Union[List[str], List[Dict]]:
+        remote_das = await self.connect()
+        kwargs.pop('no_iterator', None)
+        kwargs['cursor'] = 0
+        links = self.local_query_engine.get_links(link_type, target_types, link_targets, **kwargs)
+        return await self._fetch_pages(
+            links,
+            lambda **page: remote_das.get_links(link_type, target_types, link_targets, **page),
+            kwargs,
+        )
+
+    async def get_incoming_links(self, atom_handle: str, **kwargs) -> List[Any]:
+        remote_das = await self.connect()
+        kwargs.pop('no_iterator', None)
+        kwargs['cursor'] = 0
+        kwargs['handles_only'] = False
+        links = self.local_query_engine.get_incoming_links(atom_handle, **kwargs)
+        return await self._fetch_pages(
+            links, lambda **page: remote_das.get_incoming_links(atom_handle, **page), kwargs
+        )
+
+    async def query(
+        self,
+        query: Union[List[Dict[str, Any]], Dict[str, Any]],
+        parameters: Optional[Dict[str, Any]] = {},
+    ) -> List[Dict[str, Any]]:
+        query_scope = parameters.get('query_scope', 'remote_only')
+        if query_scope == 'remote_only' or query_scope == 'synchronous_update':
+            if query_scope == 'synchronous_update':
+                await self.commit()
+            limit, offset = LocalQueryEngine._result_window(parameters)
+            return_type = LocalQueryEngine._return_type(parameters)
+            remote_das = await self.connect()
+            answer = await remote_das.query(query, RemoteQueryEngine._remote_parameters(parameters))
+            answer = RemoteQueryEngine._format_answer(answer, limit, offset, return_type)
+        elif query_scope == 'local_only':
+            answer = self.local_query_engine.query(query, parameters)
+        elif query_scope == 'local_and_remote':
+            # This type is not available yet
+            raise QueryParametersException
+        else:
+            raise QueryParametersException(
+                message=f'Invalid value for parameter "query_scope": "{query_scope}"'
+            )
+        return answer
+
+    async def count_atoms(self) -> Tuple[int, int]:
+        local_answer = self.local_query_engine.count_atoms()
+        remote_das = await self.connect()
+        remote_answer = await remote_das.count_atoms()
+        return tuple([x + y for x, y in zip(local_answer, remote_answer)])
+
+    async def commit(self):
+        remote_das = await self.connect()
+        return await remote_das.commit_changes()
@@ -0,0 +1,278 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from hyperon_das_atomdb.exceptions import NodeDoesNotExist
+
+from hyperon_das.cache import (
+    AndEvaluator,
+    AtomDocumentCache,
+    LazyQueryEvaluator,
+    ListIterator,
+    QueryAnswerIterator,
+)
+from hyperon_das.exceptions import QueryParametersException
+from hyperon_das.utils import Assignment, QueryAnswer
+
+if TYPE_CHECKING:  # pragma no cover
+    from hyperon_das.query_engines import LocalQueryEngine, QueryEngine
+
+
+class QueryPlan(ABC):
+    def __init__(self, variables: Set[str], slots: Set[str]):
+        self.variables = variables
+        self.slots = slots
+
+    @abstractmethod
+    def instantiate(
+        self,
+        bindings: Dict[str, str],
+        mappings: Optional[Assignment],
+        parameters: Optional[Dict[str, Any]],
+        document_cache: AtomDocumentCache,
+        handles_only: bool = False,
+    ) -> QueryAnswerIterator:
+        # With handles_only the subgraphs of the answers only have the handles of the
+        # matched atoms, so no atom document is fetched
+        ...
+
+
+class NodePlan(QueryPlan):
+    def __init__(self, engine: 'LocalQueryEngine', node_type: str, node_name: str):
+        super().__init__(set(), set())
+        self.engine = engine
+        self.node_type = node_type
+        self.node_name = node_name
+
+    def resolve(self, document_cache: Optional[AtomDocumentCache] = None) -> Optional[str]:
+        # The node is looked up once per execution (i.e. per document cache) so that the
+        # plan sees the atoms added or removed (e.g. by clear()) after it was built
+        key = (self.node_type, self.node_name)
+        if document_cache is not None and key in document_cache.node_handles:
+            return document_cache.node_handles[key]
+        try:
+            handle = self.engine.local_backend.get_node_handle(self.node_type, self.node_name)
+        except NodeDoesNotExist:
+            handle = None
+        if document_cache is not None:
+            document_cache.node_handles[key] = handle
+        return handle
+
+    def instantiate(
+        self, bindings, mappings, parameters, document_cache, handles_only=False
+    ) -> QueryAnswerIterator:
+        handle = self.resolve(document_cache)
+        if handle is None:
+            return ListIterator([])
+        # The document is only fetched when the answers carry documents
+        if handles_only:
+            return ListIterator([QueryAnswer({"handle": handle}, None)])
+        document_cache.fetch([handle], self.engine._get_atoms_as_dict)
+        return ListIterator([QueryAnswer(document_cache.get_subgraph(handle), None)])
+
+
+class ParameterPlan(QueryPlan):
+    def __init__(self, engine: 'LocalQueryEngine', node_type: str, slot: str):
+        super().__init__(set(), {slot})
+        self.engine = engine
+        self.node_type = node_type
+        self.slot = slot
+
+    def instantiate(
+        self, bindings, mappings, parameters, document_cache, handles_only=False
+    ) -> QueryAnswerIterator:
+        if self.slot not in bindings:
+            raise QueryParametersException(
+                message=f'Missing value for query parameter "{self.slot}"',
+                details=f'bindings: {bindings}',
+            )
+        backend = self.engine.local_backend
+        try:
+            handle = backend.get_node_handle(self.node_type, bindings[self.slot])
+        except NodeDoesNotExist:
+            return ListIterator([])
+        if handles_only:
+            return ListIterator([QueryAnswer({"handle": handle}, None)])
+        document_cache.fetch([handle], self.engine._get_atoms_as_dict)
+        return ListIterator([QueryAnswer(document_cache.get_subgraph(handle), None)])
+
+
+class VariablePlan(QueryPlan):
+    def __init__(self, target: Dict[str, Any]):
+        super().__init__({target["name"]}, set())
+        self.name = target["name"]
+        self.answer = QueryAnswer(target, None)
+
+    def instantiate(
+        self, bindings, mappings, parameters, document_cache, handles_only=False
+    ) -> QueryAnswerIterator:
+        value = mappings.get(self.name) if mappings else None
+        if value is not None:
+            binding = Assignment()
+            binding.assign(self.name, value)
+            binding.freeze()
+            return ListIterator([QueryAnswer({"handle": value}, binding)])
+        return ListIterator([self.answer])
+
+
+class LinkPlan(QueryPlan):
+    def __init__(self, engine: 'LocalQueryEngine', link_type: str, targets: List[QueryPlan]):
+        super().__init__(
+            set().union(*[target.variables for target in targets]),
+            set().union(*[target.slots for target in targets]),
+        )
+        self.engine = engine
+        self.link_type = link_type
+        self.targets = targets
+
+    def instantiate(
+        self, bindings, mappings, parameters, document_cache, handles_only=False
+    ) -> QueryAnswerIterator:
+        restart = [
+            partial(
+                target.instantiate, bindings, mappings, parameters, document_cache, handles_only
+            )
+            for target in self.targets
+        ]
+        return LazyQueryEvaluator(
+            self.link_type,
+            [instantiate() for instantiate in restart],
+            self.engine,
+            parameters,
+            document_cache,
+            handles_only,
+            restart,
+        )
+
+
+class ConjunctionPlan(QueryPlan):
+    # Number of distinct bindings whose answers are kept for each clause evaluated with
+    # the variables bound by the previous clauses
+    BOUND_CLAUSE_CACHE_SIZE = 64
+
+    def __init__(self, clauses: List[QueryPlan]):
+        super().__init__(
+            set().union(*[clause.variables for clause in clauses]),
+            set().union(*[clause.slots for clause in clauses]),
+        )
+        self.clauses = clauses
+
+    def _bound_clause(
+        self,
+        clause: QueryPlan,
+        bindings: Dict[str, str],
+        parameters: Optional[Dict[str, Any]],
+        document_cache: AtomDocumentCache,
+        handles_only: bool,
+    ) -> Callable[[Assignment], List[QueryAnswer]]:
+        answers: OrderedDict = OrderedDict()
+        variables = sorted(clause.variables)
+
+        def evaluate(assignment: Assignment) -> List[QueryAnswer]:
+            key = tuple(
+                (label, value)
+                for label, value in zip(variables, map(assignment.get, variables))
+                if value is not None
+            )
+            if key in answers:
+                answers.move_to_end(key)
+                return answers[key]
+            mappings = Assignment()
+            for label, value in key:
+                mappings.assign(label, value)
+            mappings.freeze()
+            answer = list(
+                clause.instantiate(bindings, mappings, parameters, document_cache, handles_only)
+            )
+            answers[key] = answer
+            if len(answers) > self.BOUND_CLAUSE_CACHE_SIZE:
+                answers.popitem(last=False)
+            return answer
+
+        return evaluate
+
+    def instantiate(
+        self, bindings, mappings, parameters, document_cache, handles_only=False
+    ) -> QueryAnswerIterator:
+        sideways_binding = (parameters or {}).get("sideways_binding", True)
+        bound = set(mappings.labels) if mappings else set()
+        pending = list(range(len(self.clauses)))
+        order = []
+        sources = []
+        while pending:
+            if sideways_binding:
+                # Clauses with fewer unbound variables are the most selective ones
+                index = min(pending, key=lambda i: (len(self.clauses[i].variables - bound), i))
+            else:
+                index = pending[0]
+            pending.remove(index)
+            clause = self.clauses[index]
+            if sources and sideways_binding and clause.variables & bound:
+                sources.append(
+                    self._bound_clause(clause, bindings, parameters, document_cache, handles_only)
+                )
+            else:
+                sources.append(
+                    clause.instantiate(bindings, mappings, parameters, document_cache, handles_only)
+                )
+            bound.update(clause.variables)
+            order.append(index)
+        return AndEvaluator(
+            sources, order, document_cache, (parameters or {}).get("max_workers", 1)
+        )
+
+
+def bind_template(
+    query: Union[List[Dict[str, Any]], Dict[str, Any]], bindings: Dict[str, str]
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    if isinstance(query, list):
+        return [bind_template(expression, bindings) for expression in query]
+    if query.get("atom_type") == "parameter":
+        if query["name"] not in bindings:
+            raise QueryParametersException(
+                message=f'Missing value for query parameter "{query["name"]}"',
+                details=f'bindings: {bindings}',
+            )
+        return {"atom_type": "node", "type": query["type"], "name": bindings[query["name"]]}
+    if query.get("atom_type") == "link":
+        return {**query, "targets": [bind_template(t, bindings) for t in query["targets"]]}
+    return query
+
+
+class PreparedQuery:
+    def __init__(
+        self,
+        engine: 'QueryEngine',
+        template: Union[List[Dict[str, Any]], Dict[str, Any]],
+        plan: Optional[QueryPlan] = None,
+    ):
+        self.engine = engine
+        self.template = template
+        self.plan = plan
+
+    @property
+    def slots(self) -> Set[str]:
+        if self.plan is not None:
+            return set(self.plan.slots)
+        slots = set()
+        pending = [self.template]
+        while pending:
+            query = pending.pop()
+            if isinstance(query, list):
+                pending.extend(query)
+            elif query.get("atom_type") == "parameter":
+                slots.add(query["name"])
+            else:
+                pending.extend(query.get("targets", []))
+        return slots
+
+    def execute(
+        self,
+        bindings: Optional[Dict[str, str]] = None,
+        parameters: Optional[Dict[str, Any]] = {},
+    ) -> Union[QueryAnswerIterator, List[Tuple[Assignment, Dict[str, str]]]]:
+        bindings = bindings or {}
+        if self.plan is None:
+            return self.engine.query(bind_template(self.template, bindings), parameters)
+        return self.engine._execute_plan(self.plan, bindings, parameters, self.template)
@@ -1,11 +1,24 @@
-from dataclasses import dataclass
 from importlib import import_module
-from typing import Any, Dict, FrozenSet, List, Optional, Set, Union
+from sys import intern
+from typing import Any, Dict, FrozenSet, KeysView, List, Optional, Union
+from weakref import WeakValueDictionary
 
 from hyperon_das.exceptions import InvalidAssignment
 
+# Frozen assignments with the same variables share one label set, for as long as any
+# of them is alive
+_LABEL_SETS: 'WeakValueDictionary[FrozenSet[str], FrozenSet[str]]' = WeakValueDictionary()
+
 
 class Assignment:
+    # Copies of a frozen assignment point to it and only store their own bindings, so
+    # extending a k-variable assignment costs the size of the extension rather than k.
+    # The hash is the XOR of the hashes of the bindings and is kept up to date by
+    # assign(). Chains longer than MAX_DEPTH are flattened when copied.
+    __slots__ = ('hashcode', 'digest', 'depth', 'parent', 'bindings', '_labels', '_mapping')
+
+    MAX_DEPTH = 16
+
     @staticmethod
     def compose(components: List["Assignment"]) -> Optional["Assignment"]:
         answer = Assignment()
@@ -16,13 +29,54 @@ class Assignment:
         return answer
 
     def __init__(self, other: Optional["Assignment"] = None):
-        self.labels: Union[Set[str], FrozenSet] = set()
-        self.values: Union[Set[str], FrozenSet] = set()
         self.hashcode: int = 0
+        self.digest: int = other.digest if other else 0
+        self.parent: Optional[Assignment] = None
+        self.depth: int = 0
+        self.bindings: Dict[str, str] = {}
+        self._labels: Optional[FrozenSet[str]] = None
+        self._mapping: Optional[Dict[str, str]] = None
         if other:
-            self.mapping: Dict[str, str] = dict(other.mapping)
-        else:
-            self.mapping: Dict[str, str] = {}
+            if other.frozen() and other.depth < self.MAX_DEPTH:
+                self.parent = other
+                self.depth = other.depth + 1
+            else:
+                self.bindings = dict(other.mapping)
+
+    @property
+    def mapping(self) -> Dict[str, str]:
+        if self.parent is None:
+            return self.bindings
+        if self._mapping is None:
+            mapping = dict(self.parent.mapping)
+            mapping.update(self.bindings)
+            if not self.frozen():
+                return mapping
+            self._mapping = mapping
+        return self._mapping
+
+    @property
+    def labels(self) -> Union[KeysView, FrozenSet[str]]:
+        if not self.frozen():
+            return self.mapping.keys()
+        if self._labels is None:
+            # The key must be another object than the value for the entry to expire
+            labels = frozenset(self.mapping)
+            self._labels = _LABEL_SETS.setdefault(frozenset(self.mapping), labels)
+        return self._labels
+
+    @property
+    def values(self) -> FrozenSet[str]:
+        return frozenset(self.mapping.values())
+
+    def get(self, label: str) -> Optional[str]:
+        assignment = self
+        while assignment is not None:
+            value = assignment.bindings.get(label)
+            if value is not None:
+                return value
+            assignment = assignment.parent
+        return None
 
     def __hash__(self) -> int:
         assert self.hashcode
@@ -49,9 +103,7 @@ class Assignment:
         if self.frozen():
             return False
         else:
-            self.labels = frozenset(self.labels)
-            self.values = frozenset(self.values)
-            self.hashcode = hash(frozenset(self.mapping.items()))
+            self.hashcode = self.digest or 1
             return True
 
     def assign(
@@ -65,14 +117,16 @@ class Assignment:
                 message="Invalid assignment",
                 details=f"label = {label} value = {value} hashcode = {self.hashcode}",
             )
-        if label in self.labels:
-            return self.mapping[label] == value
+        current_value = self.get(label)
+        if current_value is not None:
+            return current_value == value
         else:
-            if parameters and parameters['no_overload'] and value in self.values:
+            if parameters and parameters['no_overload'] and value in self.mapping.values():
                 return False
-            self.labels.add(label)
-            self.values.add(value)
-            self.mapping[label] = value
+            # Variable names come from the queries, so there are few distinct ones
+            label = intern(label) if type(label) is str else label
+            self.bindings[label] = value
+            self.digest ^= hash((label, value))
             return True
 
     def merge(self, other: "Assignment", in_place: bool = True) -> Optional[bool]:
@@ -92,10 +146,20 @@ class Assignment:
                 return None
 
 
-@dataclass
 class QueryAnswer:
-    subgraph: Optional[Dict] = None
-    assignment: Optional[Assignment] = None
+    __slots__ = ('subgraph', 'assignment')
+
+    def __init__(self, subgraph: Optional[Dict] = None, assignment: Optional[Assignment] = None):
+        self.subgraph = subgraph
+        self.assignment = assignment
+
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.subgraph, self.assignment) == (other.subgraph, other.assignment)
+
+    def __repr__(self) -> str:
+        return f'QueryAnswer(subgraph={self.subgraph!r}, assignment={self.assignment!r})'
 
 
 def get_package_version(package_name: str) -> str:
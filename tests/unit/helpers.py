@@ -1,5 +1,11 @@
+import gzip
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from random import choice
 from string import ascii_lowercase
+from typing import Any, Callable, Dict, Iterator
 
 from hyperon_das import DistributedAtomSpace
 
@@ -17,3 +23,60 @@ def load_n_random_links_by_type(
                 ],
             }
         )
+
+
+@contextmanager
+def remote_das_server(
+    respond: Callable[[Dict[str, Any]], Any], path: str = '/function/query-engine'
+) -> Iterator[ThreadingHTTPServer]:
+    """
+    Runs an HTTP/1.1 server on localhost which answers the JSON payloads POSTed to path
+    with respond(payload), gzipped when the client accepts it. server.connections counts
+    the connections it accepted and server.closed the ones which were closed since.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            with server.lock:
+                server.connections += 1
+
+        def finish(self):
+            super().finish()
+            with server.lock:
+                server.closed += 1
+
+        def do_POST(self):
+            data = self.rfile.read(int(self.headers['Content-Length']))
+            if self.headers.get('Content-Encoding') == 'gzip':
+                data = gzip.decompress(data)
+            if self.path != path:
+                status, body = 404, b''
+            else:
+                status, body = 200, json.dumps(respond(json.loads(data))).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.closed = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -29,6 +29,7 @@ class DistributedAtomSpaceMock(DistributedAtomSpace):
             self.query_engine = RemoteQueryEngine(self.backend, kwargs)
         else:
             self.query_engine = LocalQueryEngine(self.backend)
+        self.result_cache = None
 
 
 class DatabaseMock(AtomDB):
@@ -1,20 +1,28 @@
+import threading
 from collections import deque
+from itertools import product
 from unittest import mock
 
 import pytest
+from hyperon_das_atomdb import WILDCARD
 
 from hyperon_das.cache import (
+    AndEvaluator,
+    AtomDocumentCache,
     BaseLinksIterator,
+    HandleCache,
+    LazyQueryEvaluator,
     ListIterator,
     LocalGetLinks,
     LocalIncomingLinks,
     ProductIterator,
+    QueryAnswerIterator,
     RemoteGetLinks,
     RemoteIncomingLinks,
     TraverseLinksIterator,
     TraverseNeighborsIterator,
 )
-from hyperon_das.utils import Assignment
+from hyperon_das.utils import Assignment, QueryAnswer
 
 
 class TestListIterator:
@@ -147,6 +155,338 @@ class TestProductIterator:
                 assert False
             assert iterator.is_empty()
 
+    def test_lazy_product(self):
+        pulled = []
+
+        class CountingIterator(QueryAnswerIterator):
+            def __init__(self, source):
+                super().__init__(source)
+                self.iterator = iter(source)
+                self.current_value = source[0]
+
+            def __next__(self):
+                value = super().__next__()
+                pulled.append(value)
+                return value
+
+            def is_empty(self):
+                return not self.source
+
+        iterator = ProductIterator(
+            [CountingIterator([1, 2]), CountingIterator([3, 4]), ListIterator([5, 6])]
+        )
+        assert next(iterator) == (1, 3, 5)
+        assert pulled == [1, 3]
+        assert list(iterator) == [
+            (1, 3, 6),
+            (1, 4, 5),
+            (1, 4, 6),
+            (2, 3, 5),
+            (2, 3, 6),
+            (2, 4, 5),
+            (2, 4, 6),
+        ]
+        assert pulled == [1, 3, 4, 2]
+
+    def test_bounded_buffer(self):
+        class StreamIterator(QueryAnswerIterator):
+            def __init__(self, source):
+                super().__init__(source)
+                self.iterator = iter(source)
+                self.current_value = source[0]
+
+            def is_empty(self):
+                return not self.source
+
+        restarts = []
+
+        def restart(items):
+            restarts.append(items)
+            return StreamIterator(items)
+
+        iterator = ProductIterator(
+            [StreamIterator([1, 2, 3]), StreamIterator([4, 5]), StreamIterator([6, 7, 8])],
+            [None, lambda: restart([4, 5]), lambda: restart([6, 7, 8])],
+            max_buffer_size=2,
+        )
+        assert list(iterator) == list(product([1, 2, 3], [4, 5], [6, 7, 8]))
+        # The second source fits in its buffer and the third one is read again
+        assert restarts == [[6, 7, 8]] * 5
+        assert iterator.buffers[1] == [4, 5]
+        assert iterator.buffers[2] is None
+
+
+def _query_answer(subgraph, **mapping):
+    assignment = Assignment()
+    for label, value in mapping.items():
+        assignment.assign(label, value)
+    assignment.freeze()
+    return QueryAnswer(subgraph, assignment)
+
+
+class TestAndEvaluator:
+    def test_join_on_shared_variables(self):
+        inheritance = ListIterator(
+            [
+                _query_answer('i1', v1='human'),
+                _query_answer('i2', v1='monkey'),
+                _query_answer('i3', v1='snake'),
+            ]
+        )
+        similarity = ListIterator(
+            [
+                _query_answer('s1', v1='human', v2='monkey'),
+                _query_answer('s2', v1='monkey', v2='human'),
+                _query_answer('s3', v1='human', v2='chimp'),
+                _query_answer('s4', v1='earthworm', v2='snake'),
+            ]
+        )
+        iterator = AndEvaluator([inheritance, similarity])
+        assert not iterator.is_empty()
+        answers = [(answer.subgraph, answer.assignment.mapping) for answer in iterator]
+        assert answers == [
+            (['i1', 's1'], {'v1': 'human', 'v2': 'monkey'}),
+            (['i1', 's3'], {'v1': 'human', 'v2': 'chimp'}),
+            (['i2', 's2'], {'v1': 'monkey', 'v2': 'human'}),
+        ]
+        assert all(answer.assignment.frozen() for answer in AndEvaluator([inheritance]))
+
+    def test_join_keeps_product_order(self):
+        def build():
+            return [
+                ListIterator([_query_answer(1, v1='a'), _query_answer(2, v1='b')]),
+                ListIterator([_query_answer(3, v2='c'), _query_answer(4, v2='d')]),
+                ListIterator(
+                    [
+                        _query_answer(5, v1='a', v2='d'),
+                        QueryAnswer(6, None),
+                        _query_answer(7, v1='b', v2='c'),
+                    ]
+                ),
+            ]
+
+        expected = []
+        for candidate in ProductIterator(build()):
+            assignment = Assignment.compose([answer.assignment for answer in candidate])
+            if assignment:
+                expected.append(([answer.subgraph for answer in candidate], assignment))
+        answers = [(answer.subgraph, answer.assignment) for answer in AndEvaluator(build())]
+        assert answers == expected
+        assert [subgraph for subgraph, _ in answers] == [
+            [1, 3, 6],
+            [1, 4, 5],
+            [1, 4, 6],
+            [2, 3, 6],
+            [2, 3, 7],
+            [2, 4, 6],
+        ]
+
+    def test_empty_sources(self):
+        iterator = AndEvaluator([ListIterator([_query_answer(1, v1='a')]), ListIterator([])])
+        assert iterator.is_empty()
+        assert list(iterator) == []
+        iterator = AndEvaluator(
+            [ListIterator([_query_answer(1, v1='a')]), ListIterator([_query_answer(2, v1='b')])]
+        )
+        assert not iterator.is_empty()
+        assert list(iterator) == []
+
+    def test_concurrent_sources(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        class BlockingIterator(ListIterator):
+            # Every source waits for the others on its first answer
+            def __next__(self):
+                if not getattr(self, 'started', False):
+                    self.started = True
+                    barrier.wait()
+                return super().__next__()
+
+        def build(iterator_class):
+            return [
+                iterator_class([_query_answer(1, v1='a'), _query_answer(2, v1='b')]),
+                iterator_class([_query_answer(3, v2='c'), _query_answer(4, v2='d')]),
+                iterator_class([_query_answer(5, v1='a', v2='d'), _query_answer(6, v1='b')]),
+            ]
+
+        expected = [
+            (answer.subgraph, answer.assignment) for answer in AndEvaluator(build(ListIterator))
+        ]
+        iterator = AndEvaluator(build(BlockingIterator), max_workers=3)
+        answers = [(answer.subgraph, answer.assignment) for answer in iterator]
+        assert answers == expected
+        assert not barrier.broken
+
+
+class TestAtomDocumentCache:
+    def test_fetch_and_subgraph(self):
+        documents = {
+            'n1': {'handle': 'n1', 'name': 'human'},
+            'n2': {'handle': 'n2', 'name': 'mammal'},
+            'l1': {'handle': 'l1', 'targets': ['n1', 'n2']},
+            'l2': {'handle': 'l2', 'targets': ['l1', 'n2']},
+        }
+        fetch = mock.Mock(side_effect=lambda handles, arity: {h: documents[h] for h in handles})
+        cache = AtomDocumentCache()
+        cache.fetch(['l2'], fetch)
+        assert fetch.call_count == 3
+        assert cache.stats() == {'documents': 4, 'hits': 1, 'misses': 4}
+        cache.fetch(['l1', 'n2'], fetch)
+        assert fetch.call_count == 3
+        assert cache.stats() == {'documents': 4, 'hits': 3, 'misses': 4}
+        subgraph = cache.get_subgraph('l2')
+        assert subgraph['targets'][0]['targets'][0] == documents['n1']
+        assert subgraph['targets'][0] == cache.get_subgraph('l1')
+        # Every call builds new dicts, so changing one subgraph doesn't change the others
+        subgraph['targets'][0]['targets'].append('n3')
+        assert cache.get_subgraph('l1')['targets'] == [documents['n1'], documents['n2']]
+        assert cache.get_subgraph('l2') is not subgraph
+        assert documents['l2']['targets'] == ['l1', 'n2']
+
+    def test_concurrent_fetch(self):
+        documents = {
+            'n1': {'handle': 'n1', 'name': 'human'},
+            'n2': {'handle': 'n2', 'name': 'mammal'},
+            'l1': {'handle': 'l1', 'targets': ['n1', 'n2']},
+        }
+        fetching_targets = threading.Event()
+        release = threading.Event()
+
+        def fetch(handles, arity=-1):
+            return {handle: documents[handle] for handle in handles}
+
+        def slow_fetch(handles, arity):
+            if 'l1' not in handles:
+                fetching_targets.set()
+                release.wait(5)
+            return fetch(handles)
+
+        cache = AtomDocumentCache()
+        thread = threading.Thread(target=cache.fetch, args=(['l1'], slow_fetch))
+        thread.start()
+        try:
+            assert fetching_targets.wait(5)
+            # The link fetched by the other thread isn't visible before its targets are
+            cache.fetch(['l1'], fetch)
+            subgraph = cache.get_subgraph('l1')
+        finally:
+            release.set()
+            thread.join()
+        assert subgraph['targets'] == [documents['n1'], documents['n2']]
+        assert cache.stats()['documents'] == 3
+
+
+class TestHandleCache:
+    def test_lru(self):
+        hasher = mock.Mock()
+        hasher.node_handle.side_effect = lambda node_type, node_name: f'{node_type}:{node_name}'
+        hasher.link_handle.side_effect = lambda link_type, targets: f'{link_type}{targets}'
+        cache = HandleCache(2, hasher)
+        assert cache.node_handles([('Concept', 'human'), ('Concept', 'human')]) == [
+            'Concept:human',
+            'Concept:human',
+        ]
+        assert cache.link_handle('Similarity', ['a', 'b']) == "Similarity['a', 'b']"
+        assert cache.node_handle('Concept', 'human') == 'Concept:human'
+        assert hasher.node_handle.call_count == 1
+        assert cache.node_handle('Concept', 'monkey') == 'Concept:monkey'
+        assert cache.link_handle('Similarity', ['a', 'b']) == "Similarity['a', 'b']"
+        assert hasher.link_handle.call_count == 2
+        assert cache.stats() == {
+            'entries': 2,
+            'hits': 2,
+            'misses': 4,
+            'evictions': 2,
+            'hit_rate': 2 / 6,
+        }
+
+    def test_concurrent_lookups(self):
+        cache = HandleCache(50)
+        names = [f'n{i % 100}' for i in range(1000)]
+        expected = [cache.hasher.node_handle('Concept', name) for name in names]
+        results = []
+
+        def lookup():
+            results.append(cache.node_handles([('Concept', name) for name in names]))
+
+        threads = [threading.Thread(target=lookup) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == [expected] * 4
+        stats = cache.stats()
+        assert stats['hits'] + stats['misses'] == 4000
+        assert stats['entries'] <= 50
+
+
+class TestLazyQueryEvaluator:
+    @pytest.fixture
+    def das(self):
+        documents = {
+            'h1': {'handle': 'h1', 'type': 'Concept', 'name': 'human'},
+            'h2': {'handle': 'h2', 'type': 'Concept', 'name': 'monkey'},
+            'x': {'handle': 'x', 'type': 'Concept', 'name': 'chimp'},
+            'l1': {'handle': 'l1', 'type': 'Similarity', 'targets': ['h1', 'x']},
+            'l2': {'handle': 'l2', 'type': 'Similarity', 'targets': ['h2', 'x']},
+        }
+        das = mock.MagicMock()
+        das._get_matched_handles.side_effect = lambda link_type, link_targets_list: [
+            [('l1', ['h1', 'x'])] if targets[0] == 'h1' else [('l2', ['h2', 'x'])]
+            for targets in link_targets_list
+        ]
+        das._get_atoms_as_dict.side_effect = lambda handles, arity: {
+            handle: dict(documents[handle]) for handle in handles
+        }
+        return das
+
+    def _evaluator(self, das, parameters):
+        return LazyQueryEvaluator(
+            'Similarity',
+            [
+                ListIterator(
+                    [QueryAnswer({'handle': 'h1'}, None), QueryAnswer({'handle': 'h2'}, None)]
+                ),
+                ListIterator([QueryAnswer({'atom_type': 'variable', 'name': 'v1'}, None)]),
+            ],
+            das,
+            parameters,
+        )
+
+    def test_batched_lookups(self, das):
+        answers = list(self._evaluator(das, {'batch_size': 2}))
+        assert [answer.subgraph['handle'] for answer in answers] == ['l1', 'l2']
+        assert [answer.assignment.mapping for answer in answers] == [{'v1': 'x'}, {'v1': 'x'}]
+        assert answers[0].subgraph['targets'][1] == {
+            'handle': 'x',
+            'type': 'Concept',
+            'name': 'chimp',
+        }
+        das._get_matched_handles.assert_called_once_with(
+            'Similarity', [['h1', WILDCARD], ['h2', WILDCARD]]
+        )
+        assert das._get_atoms_as_dict.call_args_list == [
+            mock.call({'l1', 'l2'}, 2),
+            mock.call({'h1', 'h2', 'x'}, -1),
+        ]
+
+    def test_unbatched_lookups(self, das):
+        answers = list(self._evaluator(das, {'batch_size': 1}))
+        assert [answer.subgraph['handle'] for answer in answers] == ['l1', 'l2']
+        assert das._get_matched_handles.call_count == 2
+
+    def test_restrict(self, das):
+        evaluator = self._evaluator(das, {'batch_size': 1})
+        evaluator.restrict(1, 1)
+        answers = list(evaluator)
+        assert [answer.subgraph['handle'] for answer in answers] == ['l2']
+        assert 'l1' not in evaluator.document_cache.documents
+
+        evaluator = self._evaluator(das, {'batch_size': 1})
+        evaluator.restrict(1)
+        assert [answer.subgraph['handle'] for answer in evaluator] == ['l1']
+        assert das._get_matched_handles.call_count == 3
+
 
 class ConcreteBaseLinksIterator(BaseLinksIterator):
     def get_current_value(self):
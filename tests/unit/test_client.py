@@ -1,11 +1,20 @@
+import asyncio
+import gzip
 import json
-from unittest.mock import patch
+import threading
+import time
+import zlib
+from unittest.mock import Mock, patch
 
 import pytest
-from requests import exceptions
+from hyperon_das_atomdb import AtomDoesNotExist
+from requests import adapters, exceptions
 
-from hyperon_das.client import FunctionsClient
-from hyperon_das.exceptions import ConnectionError, RequestError, TimeoutError
+from hyperon_das.client import AsyncFunctionsClient, FunctionsClient
+from hyperon_das.codecs import CODECS
+from hyperon_das.exceptions import ConnectionError, HTTPError, RequestError, TimeoutError
+
+from .helpers import remote_das_server
 
 
 class TestFunctionsClient:
@@ -219,3 +228,330 @@ class TestFunctionsClient:
 
         with pytest.raises(RequestError):
             client._send_request(payload)
+
+    def test_connection_pool(self, mock_request):
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.json.return_value = {}
+
+        with patch.object(adapters, 'HTTPAdapter', wraps=adapters.HTTPAdapter) as adapter:
+            client = FunctionsClient(url='http://example.com', pool_size=4, timeout=5)
+        adapter.assert_called_once_with(pool_connections=1, pool_maxsize=4)
+        client.get_atom(handle='123')
+        client.get_atom(handle='456')
+        assert mock_request.call_count == 2
+        assert mock_request.call_args.kwargs['timeout'] == 5
+        session = client.session
+        assert session.adapters['http://'] is client.adapter
+
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(client.session))
+        thread.start()
+        thread.join()
+        assert sessions[0] is not session
+        assert sessions[0].adapters['https://'] is client.adapter
+
+        pool = Mock(num_connections=1)
+        client.adapter.poolmanager = Mock(pools={'example.com': pool})
+        stats = client.stats()
+        assert (stats['requests'], stats['connections'], stats['reused']) == (2, 1, 1)
+
+    @staticmethod
+    def serve(mock_request, atoms, batch_actions=True):
+        payloads = []
+
+        def request(method, url, data, **kwargs):
+            payload = json.loads(data)
+            payloads.append(payload)
+            response = Mock(status_code=200)
+            if payload['action'] == 'get_atoms' and batch_actions:
+                body = [atoms.get(handle) for handle in payload['input']['handles']]
+            elif payload['action'] == 'get_atom':
+                body = atoms.get(payload['input']['handle'], 'Atom does not exist')
+            else:
+                body = {'error': f'Unknown action: {payload["action"]}'}
+            response.json.return_value = body
+            return response
+
+        mock_request.side_effect = request
+        return payloads
+
+    def test_batch_actions(self, mock_request):
+        atoms = {'h1': {'handle': 'h1'}, 'h2': {'handle': 'h2'}}
+        payloads = self.serve(mock_request, atoms)
+        client = FunctionsClient(url='http://example.com')
+        assert client.get_atoms(['h1', 'h3', 'h2']) == [atoms['h1'], None, atoms['h2']]
+        assert payloads == [{'action': 'get_atoms', 'input': {'handles': ['h1', 'h3', 'h2']}}]
+
+    def test_batch_actions_fallback(self, mock_request):
+        atoms = {'h1': {'handle': 'h1'}, 'h2': {'handle': 'h2'}}
+        payloads = self.serve(mock_request, atoms, batch_actions=False)
+        client = FunctionsClient(url='http://example.com')
+        assert client.get_atoms(['h1', 'h3']) == [atoms['h1'], None]
+        assert [payload['action'] for payload in payloads] == ['get_atoms', 'get_atom', 'get_atom']
+        assert not client.batch_actions
+        assert client.get_atoms(['h2']) == [atoms['h2']]
+        assert payloads[-1] == {'action': 'get_atom', 'input': {'handle': 'h2'}}
+
+    def test_coalescing(self, mock_request):
+        atoms = {f'h{i}': {'handle': f'h{i}'} for i in range(4)}
+        payloads = self.serve(mock_request, atoms)
+        client = FunctionsClient(url='http://example.com', coalesce_window=0.2)
+        results = {}
+        barrier = threading.Barrier(5)
+
+        def get_atom(handle):
+            barrier.wait()
+            try:
+                results[handle] = client.get_atom(handle)
+            except AtomDoesNotExist:
+                results[handle] = None
+
+        handles = [*atoms, 'h9']
+        threads = [threading.Thread(target=get_atom, args=(handle,)) for handle in handles]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == {**atoms, 'h9': None}
+        assert len(payloads) == 1
+        assert sorted(payloads[0]['input']['handles']) == sorted(handles)
+
+    def test_compression(self, mock_request):
+        requests = []
+
+        def request(method, url, data, headers=None, **kwargs):
+            encoding = (headers or {}).get('Content-Encoding')
+            requests.append(encoding)
+            if encoding == 'gzip':
+                data = gzip.decompress(data)
+            elif encoding == 'deflate' and accept_deflate:
+                data = zlib.decompress(data)
+            elif encoding is not None:
+                return Mock(status_code=415, content=b'', headers={})
+            payload = json.loads(data)
+            content = json.dumps(payload['input']).encode()
+            response = Mock(status_code=200, content=content)
+            # As if the response had been sent gzipped and decoded by requests
+            response.headers = {'Content-Length': str(len(gzip.compress(content)))}
+            response.json.return_value = payload['input']
+            return response
+
+        mock_request.side_effect = request
+        accept_deflate = True
+        query = {'atom_type': 'link', 'type': 'Expression', 'targets': [{'handle': 'h' * 32}] * 50}
+        client = FunctionsClient(url='http://example.com', compression='gzip')
+        assert client.get_atom(handle='123') == {'handle': '123'}
+        assert client.query(query) == {'query': query, 'parameters': None}
+        assert requests == [None, 'gzip']
+        stats = client.stats()
+        assert stats['bytes_sent'] < stats['bytes_sent_uncompressed'] / 5
+        assert stats['bytes_received'] < stats['bytes_received_uncompressed'] / 5
+
+        accept_deflate = False
+        client = FunctionsClient(
+            url='http://example.com', compression='deflate', compression_threshold=10
+        )
+        assert client.query(query) == {'query': query, 'parameters': None}
+        assert client.query(query) == {'query': query, 'parameters': None}
+        assert requests[2:] == ['deflate', None, None]
+        assert client.compression is None
+
+        with pytest.raises(ValueError):
+            FunctionsClient(url='http://example.com', compression='brotli')
+
+    def test_compression_errors(self, mock_request):
+        requests = []
+
+        def request(method, url, data, headers=None, **kwargs):
+            encoding = (headers or {}).get('Content-Encoding')
+            payload = json.loads(gzip.decompress(data) if encoding else data)
+            requests.append((payload['action'], encoding))
+            status = 500 if payload['action'] == 'query' else 200
+            response = Mock(status_code=status, content=b'{}', headers={})
+            response.json.return_value = {'error': 'Internal error'}
+            if status >= 400:
+                response.raise_for_status.side_effect = exceptions.HTTPError()
+            return response
+
+        mock_request.side_effect = request
+        client = FunctionsClient(
+            url='http://example.com', compression='gzip', compression_threshold=10
+        )
+        payload = {'action': 'commit_changes', 'input': {'atoms': ['h' * 32] * 10}}
+        # State changing actions aren't compressed until the server is known to accept it
+        client._send_request(payload)
+        # Errors other than 415 and 400 are not retried uncompressed
+        assert client.query({'atom_type': 'node'}) == 'Internal error'
+        client._send_request(payload)
+        assert not client.compression_accepted
+        client.get_atom(handle='h' * 32)
+        assert client.compression_accepted
+        client._send_request(payload)
+        assert requests == [
+            ('commit_changes', None),
+            ('query', 'gzip'),
+            ('commit_changes', None),
+            ('get_atom', 'gzip'),
+            ('commit_changes', 'gzip'),
+        ]
+        assert client.compression == 'gzip'
+
+    def test_compression_bad_request(self, mock_request):
+        requests = []
+
+        def request(method, url, data, headers=None, **kwargs):
+            encoding = (headers or {}).get('Content-Encoding')
+            requests.append(encoding)
+            if encoding is not None and not accept_gzip:
+                # A server which ignores Content-Encoding can't parse the body
+                status, content = 400, {'error': 'Invalid JSON'}
+            elif json.loads(gzip.decompress(data) if encoding else data)['input'] == {}:
+                status, content = 400, {'error': 'Invalid query'}
+            else:
+                status, content = 200, {'handle': 'h'}
+            response = Mock(status_code=status, content=json.dumps(content).encode(), headers={})
+            response.json.return_value = content
+            if status >= 400:
+                response.raise_for_status.side_effect = exceptions.HTTPError()
+            return response
+
+        mock_request.side_effect = request
+        accept_gzip = False
+        client = FunctionsClient(
+            url='http://example.com', compression='gzip', compression_threshold=10
+        )
+        assert client.get_atom(handle='h' * 32) == {'handle': 'h'}
+        assert client.get_atom(handle='h' * 32) == {'handle': 'h'}
+        assert requests == ['gzip', None, None]
+        assert client.compression is None
+
+        # A 400 to the uncompressed request as well doesn't turn compression off
+        requests.clear()
+        accept_gzip = True
+        client = FunctionsClient(
+            url='http://example.com', compression='gzip', compression_threshold=0
+        )
+        assert client._send_request({'action': 'query', 'input': {}}) == 'Invalid query'
+        assert requests == ['gzip', None]
+        assert client.compression == 'gzip'
+        assert not client.compression_accepted
+        # Once a compressed request has succeeded, a 400 is not retried
+        requests.clear()
+        assert client.get_atom(handle='h' * 32) == {'handle': 'h'}
+        assert client._send_request({'action': 'query', 'input': {}}) == 'Invalid query'
+        assert requests == ['gzip', 'gzip']
+
+    def test_codec(self, mock_request):
+        codec = CODECS['compact']
+        requests = []
+
+        def request(method, url, data, headers=None, **kwargs):
+            content_type = (headers or {}).get('Content-Type', 'application/json')
+            requests.append(content_type)
+            if content_type == codec.content_type:
+                payload = codec.decode(data)
+            else:
+                payload = json.loads(data)
+            response = Mock(status_code=200, headers={})
+            if payload['action'] == 'ping':
+                body = {'msg': 'pong'}
+                if supports_codec and codec.name in payload['input'].get('codecs', []):
+                    body['codec'] = codec.name
+                response.json.return_value = body
+            elif content_type == codec.content_type:
+                response.headers = {'Content-Type': codec.content_type}
+                response.content = codec.encode(payload['input'])
+            else:
+                response.json.return_value = payload['input']
+            return response
+
+        mock_request.side_effect = request
+        supports_codec = True
+        client = FunctionsClient(url='http://example.com', codec='compact')
+        assert client.codec is None
+        assert client.get_atom(handle='a' * 32) == {'handle': 'a' * 32}
+        assert client.get_atom(handle='b' * 32) == {'handle': 'b' * 32}
+        assert requests == ['application/json', codec.content_type, codec.content_type]
+        assert client.codec is codec
+
+        supports_codec = False
+        client = FunctionsClient(url='http://example.com', codec=codec)
+        assert client.get_atom(handle='a' * 32) == {'handle': 'a' * 32}
+        assert requests[3:] == ['application/json', 'application/json']
+        assert client.codec.name == 'json'
+
+        with pytest.raises(ValueError):
+            FunctionsClient(url='http://example.com', codec='msgpack')
+
+
+class TestAsyncFunctionsClient:
+    @staticmethod
+    def respond(payload):
+        if payload['action'] == 'get_atom':
+            handle = payload['input']['handle']
+            return {'handle': handle} if handle.startswith('h') else 'Atom does not exist'
+        if payload['action'] == 'count_atoms':
+            return [1, 2]
+        return payload['input']
+
+    def test_concurrent_requests(self):
+        async def run(url):
+            client = AsyncFunctionsClient(url, pool_size=2, compression='gzip')
+            atoms = await asyncio.gather(*[client.get_atom(f'h{i}') for i in range(20)])
+            with pytest.raises(AtomDoesNotExist):
+                await client.get_atom('x')
+            query = {'atom_type': 'node', 'type': 'Concept', 'name': 'n' * 2000}
+            answer = await client.query(query)
+            count = await client.count_atoms()
+            stats = client.stats()
+            await client.close()
+            return atoms, answer, count, stats
+
+        with remote_das_server(self.respond) as server:
+            url = f'http://127.0.0.1:{server.server_port}/function/query-engine'
+            atoms, answer, count, stats = asyncio.run(run(url))
+            assert server.connections <= 2
+        assert atoms == [{'handle': f'h{i}'} for i in range(20)]
+        assert answer['query']['name'] == 'n' * 2000
+        assert count == [1, 2]
+        assert stats['requests'] == 23
+        assert stats['connections'] <= 2
+        # Only the query is large enough to be compressed
+        assert stats['bytes_sent'] < stats['bytes_sent_uncompressed'] - 1500
+        assert stats['bytes_received'] < stats['bytes_received_uncompressed']
+
+    def test_event_loop_change(self):
+        async def run(client):
+            return await asyncio.gather(*[client.get_atom(f'h{i}') for i in range(4)])
+
+        with remote_das_server(self.respond) as server:
+            url = f'http://127.0.0.1:{server.server_port}/function/query-engine'
+            client = AsyncFunctionsClient(url, pool_size=2)
+            asyncio.run(run(client))
+            idle = len(client.idle)
+            assert idle > 0
+            # The connections of the first loop can't be used by the second one
+            assert asyncio.run(run(client)) == [{'handle': f'h{i}'} for i in range(4)]
+            assert client.stats()['connections'] == idle + len(client.idle)
+            for _ in range(100):
+                if server.closed >= idle:
+                    break
+                time.sleep(0.01)
+            assert server.closed == idle
+
+    def test_errors(self):
+        async def run(url, **kwargs):
+            client = AsyncFunctionsClient(url, **kwargs)
+            try:
+                return await client.count_atoms()
+            finally:
+                await client.close()
+
+        with remote_das_server(self.respond) as server:
+            port = server.server_port
+            with pytest.raises(HTTPError):
+                asyncio.run(run(f'http://127.0.0.1:{port}/wrong-path'))
+        with pytest.raises(ConnectionError):
+            asyncio.run(run(f'http://127.0.0.1:{port}/function/query-engine'))
+        with pytest.raises(ValueError):
+            AsyncFunctionsClient('ftp://127.0.0.1/')
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+from hyperon_das_atomdb import AtomDB
+
+from hyperon_das.codecs import CODECS, CompactCodec
+from hyperon_das.exceptions import DecodeError
+
+
+class TestCompactCodec:
+    def test_round_trip(self):
+        codec = CompactCodec()
+        values = [
+            None,
+            True,
+            False,
+            0,
+            -1,
+            2**70,
+            -(2**40),
+            1.5,
+            '',
+            'ção',
+            'A' * 32,
+            [],
+            {},
+            {'a': [1, {'b': None}], 'c': ['a', 'a', 'c']},
+        ]
+        for value in values:
+            assert codec.decode(codec.encode(value)) == value
+        assert codec.decode(codec.encode((1, 2))) == [1, 2]
+        with pytest.raises(TypeError):
+            codec.encode({1, 2})
+
+    def test_handles(self):
+        codec = CODECS['compact']
+        handles = [AtomDB.node_handle('Concept', f'c{i}') for i in range(10)]
+        links = [
+            {
+                'handle': AtomDB.link_handle('Similarity', [a, b]),
+                'type': 'Similarity',
+                'targets': [a, b],
+            }
+            for a in handles
+            for b in handles
+        ]
+        data = codec.encode(links)
+        assert codec.decode(data) == links
+        assert len(data) < len(json.dumps(links)) / 3
+
+    def test_invalid_data(self):
+        codec = CompactCodec()
+        data = codec.encode({'handle': 'a' * 32})
+        with pytest.raises(DecodeError):
+            codec.decode(data[:-1])
+        with pytest.raises(DecodeError):
+            codec.decode(data + b'\x00')
+        with pytest.raises(DecodeError):
+            codec.decode(b'\xff')
+        with pytest.raises(DecodeError):
+            codec.decode(codec.encode(1.5)[:3])
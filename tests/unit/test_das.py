@@ -1,13 +1,24 @@
+import asyncio
+import copy
+import json
 from unittest import mock
 
 import pytest
+from hyperon_das_atomdb import AtomDoesNotExist
 from hyperon_das_atomdb.adapters import InMemoryDB
 from hyperon_das_atomdb.exceptions import InvalidAtomDB
 
+from hyperon_das.constants import QueryOutputFormat
 from hyperon_das.das import DistributedAtomSpace, LocalQueryEngine, RemoteQueryEngine
-from hyperon_das.exceptions import GetTraversalCursorException, InvalidQueryEngine
+from hyperon_das.exceptions import (
+    GetTraversalCursorException,
+    InvalidQueryEngine,
+    QueryParametersException,
+)
+from hyperon_das.query_engines import AsyncRemoteQueryEngine
 from hyperon_das.traverse_engines import TraverseEngine
 
+from .helpers import remote_das_server
 from .mock import DistributedAtomSpaceMock
 
 
@@ -84,6 +95,115 @@ class TestDistributedAtomSpace:
 
         assert exc.value.message == 'Cannot start Traversal. Atom does not exist'
 
+    def test_get_node_handles(self):
+        das = DistributedAtomSpace()
+        nodes = [('Concept', 'human'), ('Concept', 'monkey'), ('Concept', 'human')]
+        handles = das.get_node_handles(nodes)
+        assert handles == [das.get_node_handle(*node) for node in nodes]
+        assert handles[0] == handles[2] != handles[1]
+        das.add_node({'type': 'Concept', 'name': 'human'})
+        assert das.get_node('Concept', 'human')['handle'] == handles[0]
+        assert das.get_node('Concept', 'human')['handle'] == handles[0]
+        # get_node_handles() and the query engine share one cache
+        stats = das.query_engine.handle_cache.stats()
+        assert (stats['entries'], stats['hits'], stats['misses']) == (2, 3, 2)
+        # get_node_handle() and get_link_handle() don't need an instance
+        assert DistributedAtomSpace.get_node_handle('Concept', 'human') == handles[0]
+        link = DistributedAtomSpace.get_link_handle('Similarity', handles[:2])
+        assert link == das.get_link_handle('Similarity', handles[:2])
+
+    def test_remote_get_atoms(self):
+        with mock.patch(
+            'hyperon_das.das.RemoteQueryEngine._connect_server', return_value='url-test'
+        ):
+            das = DistributedAtomSpace(query_engine='remote', host='0.0.0.0', port=1234)
+        das.add_node({'type': 'Concept', 'name': 'human'})
+        human = das.get_node_handle('Concept', 'human')
+        with mock.patch(
+            'hyperon_das.client.FunctionsClient.get_atoms', return_value=[{'handle': 'h1'}]
+        ) as get_atoms:
+            atoms = das.query_engine.get_atoms(['h1', human])
+        get_atoms.assert_called_once_with(['h1'])
+        assert [atom['handle'] for atom in atoms] == ['h1', human]
+        with mock.patch('hyperon_das.client.FunctionsClient.get_atoms', return_value=[None]):
+            with pytest.raises(AtomDoesNotExist):
+                das.query_engine.get_atoms([human, 'h2'])
+
+    def test_remote_query_window(self):
+        with mock.patch(
+            'hyperon_das.das.RemoteQueryEngine._connect_server', return_value='url-test'
+        ):
+            das = DistributedAtomSpace(query_engine='remote', host='0.0.0.0', port=1234)
+        answers = [{'handle': f'a{i}'} for i in range(30)]
+        with mock.patch(
+            'hyperon_das.client.FunctionsClient.query', return_value=answers
+        ) as remote_query:
+            parameters = {'offset': 10, 'limit': 10}
+            assert das.query({}, parameters) == answers[10:20]
+            assert das.query({}, {'offset': 25}) == answers[25:]
+            assert das.count_query({}) == 30
+        # The window is applied once, by the client, whatever the server supports
+        assert [call.args[1] for call in remote_query.call_args_list] == [{'no_iterator': True}] * 3
+        assert parameters == {'offset': 10, 'limit': 10}
+
+    def test_remote_query_return_type(self):
+        with mock.patch(
+            'hyperon_das.das.RemoteQueryEngine._connect_server', return_value='url-test'
+        ):
+            das = DistributedAtomSpace(query_engine='remote', host='0.0.0.0', port=1234)
+        link = {'handle': 'l1', 'type': 'Similarity', 'targets': [{'handle': 'h1'}]}
+        answers = [[{'v1': 'h1'}, link], [{'v1': 'h1'}, [link, link]]]
+        with mock.patch(
+            'hyperon_das.client.FunctionsClient.query', return_value=answers
+        ) as remote_query:
+            answer = das.query({}, {'return_type': QueryOutputFormat.HANDLE})
+            assert answer == [({'v1': 'h1'}, 'l1'), ({'v1': 'h1'}, ['l1', 'l1'])]
+            answer = das.query({}, {'return_type': QueryOutputFormat.JSON, 'limit': 1})
+            assert answer == [({'v1': 'h1'}, json.dumps(link))]
+            assert das.query({}, {}) == answers
+            with pytest.raises(QueryParametersException):
+                das.query({}, {'return_type': 'handles'})
+        # The server always returns ATOM_INFO and the client formats the answers
+        assert [call.args[1] for call in remote_query.call_args_list] == [{'no_iterator': True}] * 3
+
+    def test_async_remote_query_engine(self):
+        pages = {0: (1, [{'handle': 'l1'}, {'handle': 'l2'}]), 1: (0, [{'handle': 'l2'}])}
+        queries = []
+
+        def respond(payload):
+            action, payload_input = payload['action'], payload['input']
+            if action == 'get_atom':
+                return {'handle': payload_input['handle']}
+            if action == 'get_links':
+                return pages[payload_input['kwargs']['cursor']]
+            if action == 'count_atoms':
+                return [10, 20]
+            if action == 'query':
+                queries.append(payload_input['parameters'])
+                return [{'handle': f'a{i}'} for i in range(5)]
+            return {}
+
+        das = DistributedAtomSpace()
+        das.add_node({'type': 'Concept', 'name': 'human'})
+        human = das.get_node_handle('Concept', 'human')
+
+        async def run(port):
+            engine = AsyncRemoteQueryEngine(das.backend, {'host': '127.0.0.1', 'port': port})
+            atoms = await asyncio.gather(engine.get_atom(human), engine.get_atom('h1'))
+            links = await engine.get_links('Similarity', no_iterator=True)
+            count = await engine.count_atoms()
+            answer = await engine.query({}, {'limit': 2, 'offset': 1})
+            await engine.close()
+            return atoms, links, count, answer
+
+        with remote_das_server(respond) as server:
+            atoms, links, count, answer = asyncio.run(run(server.server_port))
+        assert [atom['handle'] for atom in atoms] == [human, 'h1']
+        assert links == [{'handle': 'l1'}, {'handle': 'l2'}]
+        assert count == (11, 20)
+        assert answer == [{'handle': 'a1'}, {'handle': 'a2'}]
+        assert queries == [{'no_iterator': True}]
+
     def test_info(self):
         das = DistributedAtomSpace()
         assert isinstance(das.about(), dict)
@@ -91,3 +211,71 @@ class TestDistributedAtomSpace:
         assert 'atom_db' in das.about()
         assert {'name', 'version', 'summary'} == set(das.about().get('das').keys())
         assert {'name', 'version', 'summary'} == set(das.about().get('atom_db').keys())
+
+    def test_result_cache(self):
+        das = DistributedAtomSpace(result_cache_size=2)
+        das.add_link(
+            {
+                'type': 'Inheritance',
+                'targets': [
+                    {'type': 'Concept', 'name': 'human'},
+                    {'type': 'Concept', 'name': 'mammal'},
+                ],
+            }
+        )
+        query = {
+            'atom_type': 'link',
+            'type': 'Inheritance',
+            'targets': [
+                {'atom_type': 'variable', 'name': 'v1'},
+                {'atom_type': 'node', 'type': 'Concept', 'name': 'mammal'},
+            ],
+        }
+        with mock.patch.object(
+            das.query_engine, 'query', wraps=das.query_engine.query
+        ) as engine_query:
+            answer = das.query(query, {'no_iterator': True})
+            assert len(answer) == 1
+            expected = copy.deepcopy(answer[0][1])
+            # Changing an answer doesn't change the cached one
+            answer[0][1]['targets'][0]['name'] = 'changed'
+            answer.clear()
+            answer = das.query(query, {'no_iterator': True})
+            assert len(answer) == 1
+            assert answer[0][1] == expected
+            answer[0][1]['targets'].clear()
+            assert das.query(query, {'no_iterator': True})[0][1] == expected
+            assert engine_query.call_count == 1
+
+            das.add_node({'type': 'Predicate', 'name': 'eats'})
+            assert len(das.query(query, {'no_iterator': True})) == 1
+            assert engine_query.call_count == 1
+
+            das.add_link(
+                {
+                    'type': 'Inheritance',
+                    'targets': [
+                        {'type': 'Concept', 'name': 'monkey'},
+                        {'type': 'Concept', 'name': 'mammal'},
+                    ],
+                }
+            )
+            assert len(das.query(query, {'no_iterator': True})) == 2
+            assert engine_query.call_count == 2
+
+            list(das.query(query))
+            assert engine_query.call_count == 3
+
+        assert len(das.get_links('Inheritance')) == 2
+        assert len(das.get_links('Similarity')) == 0
+        assert das.result_cache.stats() == {
+            'entries': 2,
+            'hits': 3,
+            'misses': 4,
+            'evictions': 1,
+            'invalidations': 1,
+        }
+
+        das.clear()
+        assert das.result_cache.stats()['entries'] == 0
+        assert das.get_links('Inheritance') == []
@@ -1,18 +1,28 @@
+import random
+import threading
 from copy import deepcopy
 
 import pytest
+from hyperon_das_atomdb import WILDCARD
 
 from hyperon_das.pattern_matcher import (
+    CONFIG,
     And,
+    AssignmentPartition,
     Link,
     LinkTemplate,
+    NegationIndex,
     Node,
     Not,
+    Or,
     OrderedAssignment,
     PatternMatchingAnswer,
+    TraceProfile,
     TypedVariable,
     UnorderedAssignment,
     Variable,
+    tracing,
+    tracing_enabled,
 )
 from hyperon_das.pattern_matcher.constants import CompatibilityStatus
 from tests.unit.mock import DatabaseMock
@@ -34,6 +44,36 @@ def build_unordered_assignment(d):
     return answer
 
 
+class BoundLinksDatabase:
+    def __init__(self, links):
+        self.links = links
+        self.calls = {'link_exists': 0, 'get_link_handle': 0, 'get_matched_links': 0}
+
+    def node_exists(self, node_type, node_name):
+        return True
+
+    def get_node_handle(self, node_type, node_name):
+        return node_name
+
+    def get_link_handle(self, link_type, target_handles):
+        self.calls['get_link_handle'] += 1
+        if WILDCARD in target_handles:
+            return None
+        return f'{link_type}({",".join(target_handles)})'
+
+    def link_exists(self, link_type, target_handles):
+        self.calls['link_exists'] += 1
+        return tuple(target_handles) in self.links[link_type]
+
+    def get_matched_links(self, link_type, target_handles, extra_parameters=None):
+        self.calls['get_matched_links'] += 1
+        return [
+            (f'{link_type}({",".join(targets)})', list(targets))
+            for targets in self.links[link_type]
+            if all(t == WILDCARD or t == h for t, h in zip(target_handles, targets))
+        ]
+
+
 class TestPatternMatchingAnswer:
     @pytest.fixture()
     def database(self):
@@ -77,6 +117,8 @@ class TestPatternMatchingAnswer:
                 )
                 ret2 = sorted([sorted([f'{x}={y}' for x, y in d.items()]) for d in assignments])
                 assert ret1 == ret2
+            if not answer.negation:
+                assert set(pattern.iter_matches(db)) == answer.assignments
 
         check_pattern(
             db,
@@ -1008,6 +1050,227 @@ class TestPatternMatchingAnswer:
             db, answer
         )
 
+    def test_iter_matches(self, database):
+        class CountingDatabase:
+            def __init__(self, db):
+                self.db = db
+                self.links = {}
+
+            def __getattr__(self, name):
+                return getattr(self.db, name)
+
+            def get_matched_links(self, link_type, *args, **kwargs):
+                for link in self.db.get_matched_links(link_type, *args, **kwargs):
+                    self.links[link_type] = self.links.get(link_type, 0) + 1
+                    yield link
+
+        db = CountingDatabase(database)
+        mammal = Node('Concept', 'mammal')
+        expression = And(
+            [
+                Link('Inheritance', [Variable('V1'), mammal], True),
+                Link('Similarity', [Variable('V1'), Variable('V2')], False),
+            ]
+        )
+        answer = PatternMatchingAnswer()
+        assert expression.matched(database, answer)
+        assert len(answer.assignments) > 1
+        matches = expression.iter_matches(db)
+        assert next(matches) in answer.assignments
+        consumed = db.links['Inheritance']
+        matches.close()
+        assert consumed < len(database.get_matched_links('Inheritance', [WILDCARD, mammal.handle]))
+        assert set(expression.iter_matches(database)) == answer.assignments
+        with pytest.raises(ValueError):
+            list(Not(expression).iter_matches(database))
+
+    def test_iter_matches_extra_parameters(self, database):
+        class RecordingDatabase:
+            def __init__(self, db):
+                self.db = db
+                self.parameters = []
+
+            def __getattr__(self, name):
+                return getattr(self.db, name)
+
+            def get_matched_links(self, link_type, target_handles, extra_parameters=None):
+                self.parameters.append(extra_parameters)
+                return self.db.get_matched_links(link_type, target_handles, extra_parameters)
+
+        db = RecordingDatabase(database)
+        mammal = Node('Concept', 'mammal')
+        expression = Or(
+            [
+                Link('Inheritance', [Variable('V1'), mammal], True),
+                Link('Similarity', [Variable('V1'), Variable('V2')], False),
+            ]
+        )
+        extra_parameters = {'toplevel_only': True}
+        answer = PatternMatchingAnswer()
+        assert expression.matched(database, answer, extra_parameters)
+        assert set(expression.iter_matches(db, extra_parameters)) == answer.assignments
+        assert db.parameters and all(p == extra_parameters for p in db.parameters)
+
+    def test_bound_link_existence(self):
+        pairs = {(str(i % 5), str(i % 3)) for i in range(15)}
+        evaluated = sorted(pairs)[:4]
+        links = {
+            'List': pairs,
+            'Evaluation': {('p', f'List({a},{b})') for a, b in evaluated},
+        }
+        link = Link(
+            'Evaluation',
+            [Node('Predicate', 'p'), Link('List', [Variable('V1'), Variable('V2')], True)],
+            True,
+        )
+        expected = {build_ordered_assignment({'V1': a, 'V2': b}) for a, b in evaluated}
+        threshold = CONFIG['bulk_existence_threshold']
+        try:
+            # One existence check for the unbound link and one per distinct bound link, or
+            # a single fetch of all the links matching the expression
+            for bulk_existence_threshold, link_exists, get_matched_links in [
+                (64, 16, 1),
+                (0, 1, 2),
+            ]:
+                CONFIG['bulk_existence_threshold'] = bulk_existence_threshold
+                db = BoundLinksDatabase(links)
+                answer = PatternMatchingAnswer()
+                assert link.matched(db, answer)
+                assert answer.assignments == expected
+                assert db.calls['link_exists'] == link_exists
+                assert db.calls['get_matched_links'] == get_matched_links
+                assert db.calls['get_link_handle'] == 16
+        finally:
+            CONFIG['bulk_existence_threshold'] = threshold
+
+    def test_bound_link_existence_threshold(self):
+        pairs = sorted({(str(i % 5), str(i % 3)) for i in range(15)})
+        links = {
+            'List': set(pairs),
+            # Some of the links have their targets in another order than the expression's
+            'Evaluation': {('p', f'List({a},{b})') for a, b in pairs[:4]}
+            | {(f'List({a},{b})', 'p') for a, b in pairs[4:8]},
+            'Pair': {(f'List({a},{b})', f'List({a},{b})') for a, b in pairs[:3]},
+        }
+        unordered = Link(
+            'Evaluation',
+            [Node('Predicate', 'p'), Link('List', [Variable('V1'), Variable('V2')], True)],
+            False,
+        )
+        unbound = Link(
+            'Pair',
+            [
+                Link('List', [Variable('V1'), Variable('V2')], True),
+                Link('List', [Variable('V1'), Variable('V2')], True),
+            ],
+            True,
+        )
+        threshold = CONFIG['bulk_existence_threshold']
+        try:
+            # The answer is the same just below and just above the threshold
+            for bulk_existence_threshold, get_matched_links in [(15, 1), (14, 2)]:
+                CONFIG['bulk_existence_threshold'] = bulk_existence_threshold
+                db = BoundLinksDatabase(links)
+                answer = PatternMatchingAnswer()
+                assert unordered.matched(db, answer)
+                assert answer.assignments == {
+                    build_ordered_assignment({'V1': a, 'V2': b}) for a, b in pairs[:4]
+                }
+                assert db.calls['get_matched_links'] == get_matched_links
+            # Links without bound nodes are never fetched in bulk
+            CONFIG['bulk_existence_threshold'] = 0
+            db = BoundLinksDatabase(links)
+            answer = PatternMatchingAnswer()
+            assert unbound.matched(db, answer)
+            assert answer.assignments == {
+                build_ordered_assignment({'V1': a, 'V2': b}) for a, b in pairs[:3]
+            }
+            assert db.calls['get_matched_links'] == 2
+        finally:
+            CONFIG['bulk_existence_threshold'] = threshold
+
+    def test_tracing(self, database):
+        mammal = Node('Concept', 'mammal')
+        inheritance = Link('Inheritance', [Variable('V1'), mammal], True)
+        similarity = Link('Similarity', [Variable('V1'), Variable('V2')], False)
+        expression = And([inheritance, similarity])
+        matched = And.matched
+        events = []
+        profile = TraceProfile()
+
+        def sink(event):
+            events.append(event)
+            profile(event)
+
+        with tracing(sink):
+            assert tracing_enabled()
+            answer = PatternMatchingAnswer()
+            assert expression.matched(database, answer)
+        assert not tracing_enabled()
+        assert And.matched is matched
+        assert [(e.kind, e.expression, e.depth) for e in events[:2]] == [
+            ('enter', expression, 0),
+            ('enter', inheritance, 1),
+        ]
+        assert (events[-1].kind, events[-1].expression) == ('exit', expression)
+        assert events[-1].assignments == len(answer.assignments)
+        assert events[-1].matched
+        assert len([e for e in events if e.kind == 'enter']) == len(events) / 2
+        report = dict(profile.report())
+        assert report[repr(expression)]['calls'] == 1
+        assert report[repr(similarity)]['assignments'] > 0
+        assert profile.report()[0][0] == repr(expression)
+
+        events.clear()
+        expression.matched(database, PatternMatchingAnswer())
+        assert not events
+
+        class FailingDatabase:
+            def __getattr__(self, name):
+                return getattr(database, name)
+
+            def get_matched_links(self, *args, **kwargs):
+                raise ConnectionError()
+
+        # The exit event is emitted even when matched() raises
+        events.clear()
+        with tracing(sink):
+            with pytest.raises(ConnectionError):
+                expression.matched(FailingDatabase(), PatternMatchingAnswer())
+        assert [(e.kind, e.expression, e.matched) for e in events[-2:]] == [
+            ('exit', inheritance, None),
+            ('exit', expression, None),
+        ]
+        assert len([e for e in events if e.kind == 'enter']) == len(events) / 2
+
+    def test_tracing_contexts(self, database):
+        expression = Link('Inheritance', [Variable('V1'), Node('Concept', 'mammal')], True)
+        matched = Link.matched
+        outer = []
+        inner = []
+        other_thread = []
+
+        def match_in_thread():
+            other_thread.append(tracing_enabled())
+            expression.matched(database, PatternMatchingAnswer())
+
+        with tracing(outer.append):
+            with tracing(inner.append):
+                expression.matched(database, PatternMatchingAnswer())
+            # Matches in other threads are neither traced nor nested in this trace
+            thread = threading.Thread(target=match_in_thread)
+            thread.start()
+            thread.join()
+            expression.matched(database, PatternMatchingAnswer())
+            assert tracing_enabled()
+        assert not tracing_enabled()
+        assert Link.matched is matched
+        assert other_thread == [False]
+        # Each trace got one match of expression, starting at depth 0
+        assert (inner[0].expression, inner[0].depth) == (expression, 0)
+        assert [(e.kind, e.depth) for e in outer] == [(e.kind, e.depth) for e in inner]
+        assert len([e for e in outer if e.depth == 0]) == 2
+
     def test_ordered_assignment_sets(self):
         va1 = OrderedAssignment()
         va2 = OrderedAssignment()
@@ -1127,6 +1390,78 @@ class TestPatternMatchingAnswer:
         assert a1.join(a7) is None
         assert a7.join(a1) is None
 
+    def test_composite_join_shares_components(self):
+        u1 = build_unordered_assignment({'v1': '1', 'v2': '2'})
+        u2 = build_unordered_assignment({'v2': '2', 'v3': '3'})
+        o1 = build_ordered_assignment({'v2': '2'})
+        composite = u1.join(u2)
+        joint = composite.join(o1)
+        assert joint is not None and joint is not composite
+        assert composite.ordered_mapping is None
+        assert composite.unordered_mappings == [u1, u2]
+        assert joint.ordered_mapping is o1
+        assert all(a is b for a, b in zip(joint.unordered_mappings, [u1, u2]))
+        assert joint.hash != composite.hash
+        assert u1.is_covered_by_ordered(build_ordered_assignment({'v1': '2', 'v2': '1'}))
+        assert not u1.is_covered_by_ordered(build_ordered_assignment({'v1': '1', 'v2': '1'}))
+        assert not u1.is_covered_by_ordered(o1)
+        assert u1.symbols == {'v1': 1, 'v2': 1}
+
+    def test_assignment_partition(self):
+        random.seed(0)
+
+        def random_mapping():
+            variables = random.sample(['v1', 'v2', 'v3', 'v4'], random.randint(1, 3))
+            return {variable: random.choice(['1', '2', '3']) for variable in variables}
+
+        assignments = []
+        for _ in range(60):
+            if random.random() < 0.7:
+                assignments.append(build_ordered_assignment(random_mapping()))
+            else:
+                unordered = UnorderedAssignment()
+                for variable, value in random_mapping().items():
+                    unordered.assign(variable, value)
+                if unordered.freeze():
+                    assignments.append(unordered)
+        left = assignments[:30]
+        left.extend(a.join(b) for a, b in zip(assignments[30:], assignments[31:]))
+        right = set(assignments[30:])
+        partition = AssignmentPartition(right)
+        for assignment in [a for a in left if a is not None]:
+            expected = {id(other): other for other in right if assignment.join(other) is not None}
+            candidates = partition.candidates(assignment)
+            assert len(candidates) == len({id(c) for c in candidates})
+            assert set(expected) <= {id(c) for c in candidates}
+            if isinstance(assignment, OrderedAssignment) and len(assignment.variables) > 1:
+                assert len(candidates) < len(right)
+
+    def test_negation_index(self):
+        random.seed(1)
+
+        def random_assignment():
+            variables = random.sample(['v1', 'v2', 'v3', 'v4'], random.randint(1, 3))
+            mapping = {variable: random.choice(['1', '2', '3', '4']) for variable in variables}
+            if random.random() < 0.6:
+                return build_ordered_assignment(mapping)
+            unordered = UnorderedAssignment()
+            for variable, value in mapping.items():
+                unordered.assign(variable, value)
+            return unordered if unordered.freeze() else None
+
+        tabus = {a for a in (random_assignment() for _ in range(40)) if a is not None}
+        candidates = [a for a in (random_assignment() for _ in range(80)) if a is not None]
+        unordered = [a for a in candidates if isinstance(a, UnorderedAssignment)]
+        candidates.extend(a.join(b) for a, b in zip(unordered, unordered[1:]))
+        index = NegationIndex(tabus)
+        assert len(index) == len(tabus)
+        for assignment in [a for a in candidates if a is not None]:
+            expected = all(assignment.check_negation(tabu) for tabu in tabus)
+            assert index.allows(assignment) == expected
+            assert len(index.negations(assignment)) <= len(tabus)
+        ordered = build_ordered_assignment({'v1': '5', 'v2': '6'})
+        assert index.negations(ordered) == []
+
     def test_check_negation(self):
         a1 = build_ordered_assignment({'v1': '1', 'v2': '2'})
         a2 = build_ordered_assignment({'v1': '1'})
@@ -1,5 +1,11 @@
+import json
+
+import pytest
+
 from hyperon_das.constants import QueryOutputFormat
 from hyperon_das.das import DistributedAtomSpace
+from hyperon_das.exceptions import QueryParametersException
+from hyperon_das.query_plans import ConjunctionPlan
 
 
 def _name(link, index, typed=False):
@@ -311,6 +317,30 @@ class TestQueries:
         assert len(answer) == 1
         assert answer[0][1]["handle"] == "dbcf1c7b610a5adea335bf08f6509978"
 
+        def expression(*names):
+            return {"type": "Expression", "targets": [{"type": "Symbol", "name": n} for n in names]}
+
+        for first, second in [("A", "B"), ("B", "A")]:
+            das.add_link(
+                {"type": "Expression", "targets": [expression(first, "2"), expression(second, "2")]}
+            )
+        nested = q1["targets"][1]
+        q2 = {
+            "atom_type": "link",
+            "type": "Expression",
+            "targets": [
+                nested,
+                {
+                    **nested,
+                    "targets": [{"atom_type": "variable", "name": "v3"}, nested["targets"][1]],
+                },
+            ],
+        }
+        answer = das.query(q2, query_params)
+        assert len(answer) == 2
+        # Nested targets which outgrow their buffer are evaluated again with the same answers
+        assert das.query(q2, {**query_params, "max_buffer_size": 0}) == answer
+
     def test_conjunction(self):
         das = DistributedAtomSpace()
         self.setup_animals_kb(das)
@@ -378,8 +408,312 @@ class TestQueries:
                 {"atom_type": "variable", "name": "v2"},
             ],
         }
-        for query_answer in das.query_engine._recursive_query(exp):
+        plan = das.query_engine._build_plan(exp)
+        for query_answer in das.query_engine._execute_plan(plan, {}, {}, exp):
             link = query_answer.subgraph
             assignment = query_answer.assignment
             assert assignment.mapping["v1"] == link["targets"][0]["handle"]
             assert assignment.mapping["v2"] == link["targets"][1]["handle"]
+
+    def test_sideways_binding(self, monkeypatch):
+        das = DistributedAtomSpace()
+        self.setup_animals_kb(das)
+        similarity = {
+            "atom_type": "link",
+            "type": "Similarity",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "variable", "name": "v2"},
+            ],
+        }
+        inheritance = {
+            "atom_type": "link",
+            "type": "Inheritance",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "node", "type": "Concept", "name": "mammal"},
+            ],
+        }
+
+        def _answers(parameters):
+            return sorted(
+                (
+                    tuple(sorted(assignment.mapping.items())),
+                    tuple(link["handle"] for link in subgraph),
+                )
+                for assignment, subgraph in das.query([similarity, inheritance], parameters)
+            )
+
+        expected = _answers({"no_iterator": True, "sideways_binding": False})
+        assert len(expected) == 8
+        parameters = {"no_iterator": True, "sideways_binding": False, "max_workers": 2}
+        assert _answers(parameters) == expected
+
+        calls = []
+        get_matched_handles = das.query_engine._get_matched_handles
+
+        def _get_matched_handles(link_type, link_targets_list, **kwargs):
+            calls.extend((link_type, link_targets) for link_targets in link_targets_list)
+            return get_matched_handles(link_type, link_targets_list, **kwargs)
+
+        das.query_engine._get_matched_handles = _get_matched_handles
+        assert _answers({"no_iterator": True}) == expected
+        mammal = das.get_node_handle("Concept", "mammal")
+        assert calls[0] == ("Inheritance", ["*", mammal])
+        assert all(
+            link_type == "Similarity" and targets[0] != "*" for link_type, targets in calls[1:]
+        )
+        assert len(calls) == 5
+
+        # Each distinct binding of v2 is looked up once while its answers are kept
+        chained = [
+            similarity,
+            {
+                **inheritance,
+                "targets": [
+                    {"atom_type": "variable", "name": "v2"},
+                    {"atom_type": "variable", "name": "v3"},
+                ],
+            },
+        ]
+        calls.clear()
+        expected = das.query(chained, {"no_iterator": True})
+        distinct = len({assignment.mapping["v2"] for assignment, _ in expected})
+        assert len(calls) == 1 + distinct
+        monkeypatch.setattr(ConjunctionPlan, "BOUND_CLAUSE_CACHE_SIZE", 0)
+        calls.clear()
+        assert das.query(chained, {"no_iterator": True}) == expected
+        assert len(calls) == 15
+
+    def test_document_cache(self):
+        das = DistributedAtomSpace()
+        self.setup_animals_kb(das)
+        exp = {
+            "atom_type": "link",
+            "type": "Inheritance",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "node", "type": "Concept", "name": "mammal"},
+            ],
+        }
+        query_answer = das.query(exp)
+        answers = list(query_answer)
+        assert len(answers) == 4
+        mammal = answers[0].subgraph["targets"][1]
+        assert all(answer.subgraph["targets"][1] == mammal for answer in answers)
+        stats = query_answer.document_cache.stats()
+        assert stats["misses"] == stats["documents"] == 9
+        # Answers don't share dicts, so changing one of them leaves the others unchanged
+        mammal["name"] = "changed"
+        answers[0].subgraph["targets"].append(mammal)
+        assert all(answer.subgraph["targets"][1]["name"] == "mammal" for answer in answers[1:])
+        assert all(len(answer.subgraph["targets"]) == 2 for answer in answers[1:])
+        similarity = {
+            "atom_type": "link",
+            "type": "Similarity",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "variable", "name": "v2"},
+            ],
+        }
+        answers = das.query([exp, similarity], {"no_iterator": True})
+        assert len({id(subgraph[0]) for _, subgraph in answers}) == len(answers)
+        answers[0][1][0]["targets"].clear()
+        assert all(len(subgraph[0]["targets"]) == 2 for _, subgraph in answers[1:])
+
+    def test_prepared_query(self):
+        das = DistributedAtomSpace()
+        self.setup_animals_kb(das)
+        template = [
+            {
+                "atom_type": "link",
+                "type": "Similarity",
+                "targets": [
+                    {"atom_type": "parameter", "type": "Concept", "name": "species"},
+                    {"atom_type": "variable", "name": "v1"},
+                ],
+            },
+            {
+                "atom_type": "link",
+                "type": "Inheritance",
+                "targets": [
+                    {"atom_type": "variable", "name": "v1"},
+                    {"atom_type": "node", "type": "Concept", "name": "mammal"},
+                ],
+            },
+        ]
+        plan = das.prepare(template)
+        assert plan.slots == {"species"}
+
+        calls = []
+        get_node_handle = das.backend.get_node_handle
+
+        def _get_node_handle(node_type, node_name):
+            calls.append(node_name)
+            return get_node_handle(node_type, node_name)
+
+        das.backend.get_node_handle = _get_node_handle
+        for species in ["human", "chimp", "snake"]:
+            query = [
+                {
+                    **template[0],
+                    "targets": [
+                        {"atom_type": "node", "type": "Concept", "name": species},
+                        template[0]["targets"][1],
+                    ],
+                },
+                template[1],
+            ]
+            das.backend.get_node_handle = get_node_handle
+            expected = das.query(query, {"no_iterator": True})
+            das.backend.get_node_handle = _get_node_handle
+            answer = plan.execute({"species": species}, {"no_iterator": True})
+            assert [a.mapping for a, _ in answer] == [a.mapping for a, _ in expected]
+            assert [[link["handle"] for link in s] for _, s in answer] == [
+                [link["handle"] for link in s] for _, s in expected
+            ]
+        # The node in the template is looked up once per execution
+        assert calls == ["human", "mammal", "chimp", "mammal", "snake", "mammal"]
+
+        with pytest.raises(QueryParametersException):
+            plan.execute({}, {"no_iterator": True})
+
+        # Nodes are looked up on every execution, so removed nodes aren't returned
+        plan = das.prepare({"atom_type": "node", "type": "Concept", "name": "mammal"})
+        assert len(plan.execute({}, {"no_iterator": True})) == 1
+        das.clear()
+        assert plan.execute({}, {"no_iterator": True}) == []
+        assert (
+            plan.execute({}, {"no_iterator": True, "return_type": QueryOutputFormat.HANDLE}) == []
+        )
+
+    def test_limit_and_offset(self):
+        das = DistributedAtomSpace()
+        self.setup_animals_kb(das)
+        similarity = {
+            "atom_type": "link",
+            "type": "Similarity",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "variable", "name": "v2"},
+            ],
+        }
+        inheritance = {
+            "atom_type": "link",
+            "type": "Inheritance",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "node", "type": "Concept", "name": "mammal"},
+            ],
+        }
+        for query in [similarity, [similarity, inheritance]]:
+            answers = das.query(query, {"no_iterator": True})
+            assert das.query(query, {"no_iterator": True, "limit": 3}) == answers[:3]
+            assert das.query(query, {"no_iterator": True, "offset": 2}) == answers[2:]
+            assert das.query(query, {"no_iterator": True, "offset": 2, "limit": 2}) == answers[2:4]
+            assert das.query(query, {"no_iterator": True, "limit": 0}) == []
+
+        with pytest.raises(QueryParametersException):
+            das.query(similarity, {"limit": -1})
+
+    def test_count_query(self, monkeypatch):
+        das = DistributedAtomSpace()
+        self.setup_animals_kb(das)
+        similarity = {
+            "atom_type": "link",
+            "type": "Similarity",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "variable", "name": "v2"},
+            ],
+        }
+        inheritance = {
+            "atom_type": "link",
+            "type": "Inheritance",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "node", "type": "Concept", "name": "mammal"},
+            ],
+        }
+        same_target = {
+            "atom_type": "link",
+            "type": "Similarity",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "variable", "name": "v1"},
+            ],
+        }
+        missing_node = {
+            "atom_type": "link",
+            "type": "Inheritance",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "node", "type": "Concept", "name": "unicorn"},
+            ],
+        }
+        queries = [similarity, inheritance, same_target, missing_node, [similarity, inheritance]]
+        for query in queries:
+            expected = len(das.query(query, {"no_iterator": True}))
+            with monkeypatch.context() as patch:
+                patch.setattr(das.query_engine, "_get_atoms_as_dict", None)
+                patch.setattr(das.backend, "get_atom_as_dict", None)
+                assert das.count_query(query) == expected
+        assert das.count_query(similarity) == 14
+        assert das.count_query([similarity, inheritance]) == 8
+
+    def test_return_type(self, monkeypatch):
+        das = DistributedAtomSpace()
+        self.setup_animals_kb(das)
+        similarity = {
+            "atom_type": "link",
+            "type": "Similarity",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "variable", "name": "v2"},
+            ],
+        }
+        inheritance = {
+            "atom_type": "link",
+            "type": "Inheritance",
+            "targets": [
+                {"atom_type": "variable", "name": "v1"},
+                {"atom_type": "node", "type": "Concept", "name": "mammal"},
+            ],
+        }
+        for query in [similarity, inheritance, [similarity, inheritance]]:
+            expected = das.query(query, {"no_iterator": True})
+            with monkeypatch.context() as patch:
+                patch.setattr(das.query_engine, "_get_atoms_as_dict", None)
+                patch.setattr(das.backend, "get_atom_as_dict", None)
+                answer = das.query(
+                    query, {"no_iterator": True, "return_type": QueryOutputFormat.HANDLE}
+                )
+            assert [a.mapping for a, _ in answer] == [a.mapping for a, _ in expected]
+            for (_, handles), (_, subgraph) in zip(answer, expected):
+                if isinstance(subgraph, list):
+                    assert handles == [link["handle"] for link in subgraph]
+                else:
+                    assert handles == subgraph["handle"]
+            answer = das.query(query, {"no_iterator": True, "return_type": QueryOutputFormat.JSON})
+            assert [json.loads(s) for _, s in answer] == [s for _, s in expected]
+
+        mammal = {"atom_type": "node", "type": "Concept", "name": "mammal"}
+        with monkeypatch.context() as patch:
+            patch.setattr(das.backend, "get_atom_as_dict", None)
+            answer = das.query(
+                mammal, {"no_iterator": True, "return_type": QueryOutputFormat.HANDLE}
+            )
+        assert [handles for _, handles in answer] == [das.get_node_handle("Concept", "mammal")]
+
+        # The internal flag selecting handles isn't added to the query parameters
+        parameters = {"return_type": QueryOutputFormat.HANDLE}
+        answer = das.query(similarity, parameters)
+        assert answer.source.handles_only
+        assert (
+            answer.source.query_parameters
+            == parameters
+            == {"return_type": QueryOutputFormat.HANDLE}
+        )
+
+        with pytest.raises(QueryParametersException):
+            das.query(similarity, {"return_type": "handles"})
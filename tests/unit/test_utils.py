@@ -1,7 +1,9 @@
+import gc
+
 import pytest
 
 from hyperon_das.exceptions import InvalidAssignment
-from hyperon_das.utils import Assignment
+from hyperon_das.utils import _LABEL_SETS, Assignment, QueryAnswer
 
 
 def _build_assignment(mappings):
@@ -52,6 +54,27 @@ class TestAssignment:
         assert not a1.__eq__(a3)
         assert not a3.__eq__(a1)
 
+    def test_compact_representation(self):
+        a1 = _build_assignment([("v1", "1"), ("v2", "22")])
+        a2 = _build_assignment([("v2", "".join(["2", "2"])), ("v1", "3")])
+        assert a1.values == {"1", "22"}
+        assert a1.freeze()
+        assert a2.freeze()
+        assert a1.labels == {"v1", "v2"}
+        assert a1.labels is a2.labels
+        # Label sets are dropped along with the last assignment using them
+        a3 = _build_assignment([("compact_v1", "1")])
+        a3.freeze()
+        labels = a3.labels
+        assert _LABEL_SETS[labels] is labels
+        del a3, labels
+        gc.collect()
+        assert frozenset(["compact_v1"]) not in _LABEL_SETS
+        with pytest.raises(AttributeError):
+            a1.other = None
+        assert QueryAnswer("s", a1) == QueryAnswer("s", a1)
+        assert QueryAnswer("s", a1) != QueryAnswer("s", a2)
+
     def test_assignment_sets(self):
         va1 = Assignment()
         va2 = Assignment()
@@ -140,3 +163,30 @@ class TestAssignment:
         assert not a1.__eq__(a3)
         assert not a2.__eq__(a3)
         assert a3.__eq__(a4)
+
+        a5 = _build_assignment([("v1", "2")])
+        a5.freeze()
+        assert a3.merge(a5, in_place=False) is None
+        assert a5.merge(a3, in_place=False) is None
+
+    def test_chained_merge(self):
+        assignment = _build_assignment([("v0", "0")])
+        assignment.freeze()
+        for i in range(1, 2 * Assignment.MAX_DEPTH):
+            extension = _build_assignment([(f"v{i}", str(i))])
+            extension.freeze()
+            assignment = assignment.merge(extension, in_place=False)
+            assert assignment.depth <= Assignment.MAX_DEPTH
+        flat = _build_assignment(
+            [(f"v{i}", str(i)) for i in reversed(range(2 * Assignment.MAX_DEPTH))]
+        )
+        flat.freeze()
+        assert assignment == flat
+        assert hash(assignment) == hash(flat)
+        assert assignment.mapping == flat.mapping
+        assert assignment.labels is flat.labels
+        assert assignment.get("v3") == "3"
+        assert assignment.get("w") is None
+        conflict = _build_assignment([("v3", "4")])
+        conflict.freeze()
+        assert assignment.merge(conflict, in_place=False) is None